@@ -1,5 +1,12 @@
 import streamlit as st
 
+from core import metrics, payload, startup
+from core.llm import warm_up
+from core.perf_panel import ADMIN, show_panel
+
+# Load the model on the Ollama server in the background (once per process)
+warm_up()
+
 # Page setup
 dashpage = st.Page(
     "views/sales_dashboard.py",
@@ -28,5 +35,14 @@ pg = st.navigation(
 # Set logo (ensure assets/midhun.png exists)
 st.logo("assets/midhun.png")
 
-# Run navigation
-pg.run()
\ No newline at end of file
+# Run navigation, timing the whole rerun (and the process's first one as its startup) and
+# checking what it sent against the payload budget; admins (EV_DASHBOARD_ADMIN=1) get the performance panel
+run = metrics.begin_run(pg.title)
+try:
+    with metrics.timer('rerun', page=pg.title):
+        pg.run()
+finally:
+    startup.record_rerun(run, pg.title)
+    payload.check_budget(pg.title)
+    if ADMIN:
+        show_panel(run)
\ No newline at end of file
@@ -0,0 +1,43 @@
+import time
+
+# Stand-in for ollama.Client in the benchmarks. It streams a canned answer in
+# the same chunk format as the real server, so ChatStream, the response cache
+# and the report code run unchanged without a GPU or a network round trip.
+
+MODEL = 'benchmark-stub'  # its own model name keeps stub answers out of real cache lookups
+
+ANSWER = (
+    "EV sales keep growing quickly, led by China, Europe and the USA. Battery electric cars are taking "
+    "share from plug-in hybrids in most markets. Focus charging investment and incentives on regions "
+    "where the sales share is still below the global average, and watch for slowing growth in mature "
+    "markets such as Norway."
+)
+
+
+class StubClient:
+    """Streams ``answer`` word by word, ``delay`` seconds apart."""
+
+    def __init__(self, answer=ANSWER, delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    def chat(self, model, messages, options=None, stream=False, keep_alive=None):
+        self.calls += 1
+        words = self.answer.split(' ')
+        chunks = [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+        if not stream:
+            return {'message': {'role': 'assistant', 'content': self.answer}, 'done': True}
+        return self._stream(chunks, messages)
+
+    def _stream(self, chunks, messages):
+        for chunk in chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            yield {'message': {'role': 'assistant', 'content': chunk}, 'done': False}
+        yield {
+            'message': {'role': 'assistant', 'content': ''},
+            'done': True,
+            'eval_count': len(chunks),
+            'prompt_eval_count': sum(len(m['content']) // 4 for m in messages),
+        }
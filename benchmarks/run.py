@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Benchmark suite for the dashboard's data paths, run outside Streamlit on
+# the real dataset and synthetic copies scaled 10x and 100x:
+#   load       CSV parse, partition filter, pivot_table steps, cube build
+#   filter     the sidebar selection
+#   forecast.fit  the growth models for every region x powertrain series
+#   agg.*      each chart's aggregation
+#   figure.*   each chart's figure build incl. the choropleth, to compact JSON (with its size in bytes)
+#   kpis, dashboard (everything a rerun computes, uncached)
+#   report.*   AI insights through a stub Ollama (response cache off), figure rendering, generate_pdf_report
+# Results go to a JSON file; --compare against an earlier file flags regressions.
+#
+#   python -m benchmarks.run
+#   python -m benchmarks.run --scales 1 10 --backends pandas duckdb --compare benchmarks/results/base.json
+
+from benchmarks.ollama_stub import MODEL as STUB_MODEL, StubClient
+from benchmarks.synthetic import make_dataset
+from core import dashboard
+from core.backend import BACKENDS, get_duckdb_source
+from core.cube import build_cube
+from core.data import DEFAULT_PARTITION, _partition, _pivots, build, file_signature, read_csv
+from core.forecast import fit
+from core.llm import complete
+from core.payload import compact_json
+from core.report import format_kpis, generate_pdf_report, render_png
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+SCALES = [1, 10, 100]
+REPEAT = 5
+THRESHOLD = 1.25  # a median this many times slower than the baseline is a regression
+
+
+def measure(func, repeat):
+    """Run ``func`` ``repeat`` times; return its last result and the timings in seconds."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return result, times
+
+
+class Suite:
+    def __init__(self, repeat, render=True, verbose=True):
+        self.repeat = repeat
+        self.render = render
+        self.verbose = verbose
+        self.results = []
+
+    def bench(self, name, func, repeat=None, **context):
+        result, times = measure(func, repeat or self.repeat)
+        row = {
+            **context,
+            'benchmark': name,
+            'repeat': len(times),
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.fmean(times),
+            'max': max(times),
+        }
+        self.results.append(row)
+        if self.verbose:
+            print(f"  {context.get('backend', ''):<7} {context.get('selection', ''):<7} {name:<40} "
+                  f"{row['median'] * 1000:10.2f} ms")
+        return result
+
+    def run_scale(self, scale, backends):
+        path = make_dataset(scale)
+        context = {'scale': scale}
+
+        # load path (pandas only; the duckdb backend never builds these frames)
+        df = self.bench('load.csv', lambda: read_csv(path), backend='pandas', **context)
+        context['rows'] = self.results[-1]['rows'] = len(df)
+        part = self.bench('load.partition', lambda: _partition(df, DEFAULT_PARTITION), backend='pandas', **context)
+        sales_df, sales_share_df = self.bench('load.pivot', lambda: _pivots(part), backend='pandas', **context)
+        self.bench('load.cube', lambda: build_cube(sales_df, sales_share_df), backend='pandas', **context)
+        del df
+
+        for backend in backends:
+            if backend == 'pandas':
+                cube = build(part, (file_signature(path), ()), DEFAULT_PARTITION).cube
+            else:
+                # the first call converts the CSV to Parquet and opens the views
+                cube = self.bench('load.duckdb', lambda: get_duckdb_source(path, DEFAULT_PARTITION).cube,
+                                  repeat=1, backend=backend, **context)
+            self.run_queries(cube, {'backend': backend, **context})
+
+    def run_queries(self, cube, context):
+        # the unfiltered dashboard and a selection of every other region, which grows with the scale
+        order = cube.region_order()
+        selections = {
+            'all': (None, None),
+            'subset': dashboard.canonical_key(order[::2], cube.powertrain_order()),
+        }
+        context = {**context, 'regions': len(cube.regions)}
+        all_regions = [r for r in order if r != 'World']
+        span = dashboard.year_span(cube)
+        forecast = self.bench('forecast.fit', lambda: fit(cube), **context)
+        for label, (regions, powertrains) in selections.items():
+            ctx = {**context, 'selection': label}
+            selection = self.bench('filter', lambda: dashboard.select(cube, regions, powertrains), **ctx)
+            self.bench('filter.empty', lambda: selection.empty, **ctx)
+
+            aggregates = {
+                'agg.global_sales': lambda: cube.select(['World']).by_year(),
+                'agg.top_countries': lambda: selection.countries().by_region().nlargest(5),
+                'agg.powertrain': lambda: selection.top_level().by_year_powertrain(),
+                'agg.regional': lambda: selection.finest().by_region(),
+                'agg.yoy': lambda: selection.top_level().by_year().pct_change(),
+                'agg.map': lambda: selection.by_year_region(),
+            }
+            for name, func in aggregates.items():
+                self.bench(name, func, **ctx)
+
+            figures = dict(zip(dashboard.FIGURE_TITLES, [
+                lambda: dashboard.global_sales_figure(cube, selection, regions is not None, span, forecast),
+                lambda: dashboard.top_countries_figure(selection),
+                lambda: dashboard.powertrain_figure(selection, span, forecast),
+                lambda: dashboard.regional_figure(selection, span),
+                lambda: dashboard.yoy_figure(selection.top_level().by_year(),
+                                             forecast.by_year(selection.top_level())),
+                lambda: dashboard.map_figure(cube, selection, all_regions),
+            ]))
+            for title, func in figures.items():
+                fig_json = self.bench(f'figure.{title}', lambda: compact_json(func()), **ctx)
+                self.results[-1]['bytes'] = len(fig_json)
+
+            kpis = self.bench('kpis', lambda: dashboard.compute_kpis(cube, selection, regions, forecast), **ctx)
+            result = self.bench('dashboard', lambda: dashboard.build_dashboard(cube, regions, powertrains, forecast), **ctx)
+            self.run_report(kpis, result['figures'], span, ctx)
+
+    def run_report(self, kpis, figures, span, context):
+        client = StubClient()
+        messages = dashboard.insights_messages(kpis, span)
+        # always through the stub, and never into (or out of) the real response cache
+        insights = self.bench(
+            'report.insights',
+            lambda: complete(STUB_MODEL, messages, dashboard.INSIGHTS_OPTIONS, client=client, use_cache=False),
+            **context,
+        )
+        if self.render:
+            # kaleido is slow and independent of the data size past the figure JSON; render once
+            pngs = self.bench('report.render', lambda: {t: _render(f) for t, f in figures.items()},
+                              repeat=1, **context)
+        else:
+            pngs = dict.fromkeys(figures)
+        self.bench('report.pdf', lambda: generate_pdf_report(format_kpis(kpis), pngs, insights), **context)
+
+
+def _render(fig_json):
+    # like render_images_batch, a figure that fails to render (e.g. the map's
+    # topojson can't be fetched offline) is left out of the PDF
+    try:
+        return render_png(fig_json)
+    except Exception as e:
+        print(f'  render failed: {e}')
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions():
+    versions = {'python': platform.python_version()}
+    for package in ('pandas', 'numpy', 'plotly', 'fpdf', 'kaleido', 'pyarrow', 'duckdb'):
+        try:
+            versions[package] = __import__(package).__version__
+        except (ImportError, AttributeError):
+            versions[package] = None
+    return versions
+
+
+def _key(row):
+    return row['scale'], row.get('backend'), row.get('selection'), row['benchmark']
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Print each benchmark's median against ``baseline``; return the regressed rows."""
+    before = {_key(row): row for row in baseline['results']}
+    regressions = []
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created', '?')}):")
+    for row in results:
+        old = before.get(_key(row))
+        if old is None or not old['median']:
+            continue
+        ratio = row['median'] / old['median']
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append({**row, 'baseline_median': old['median'], 'ratio': ratio})
+        scale, backend, selection, name = _key(row)
+        print(f"  {scale:>4}x {backend or '':<7} {selection or '':<7} {name:<40} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Benchmark the dashboard data paths.')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help=f'dataset scales (default: {" ".join(map(str, SCALES))})')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['pandas'],
+                        help='query backends to benchmark (default: pandas)')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help=f'runs per benchmark (default: {REPEAT})')
+    parser.add_argument('--no-render', action='store_true', help='skip kaleido; build the PDF without images')
+    parser.add_argument('--out', type=Path, help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', type=Path, metavar='BASELINE', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f'slowdown ratio counted as a regression (default: {THRESHOLD})')
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    created = datetime.now(timezone.utc)
+    suite = Suite(args.repeat, render=not args.no_render)
+    for scale in args.scales:
+        print(f'scale {scale}x')
+        suite.run_scale(scale, args.backends)
+
+    report = {
+        'created': created.isoformat(timespec='seconds'),
+        'commit': commit,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': _versions(),
+        'config': {'scales': args.scales, 'backends': args.backends, 'repeat': args.repeat,
+                   'render': not args.no_render},
+        'results': suite.results,
+    }
+    regressions = []
+    if args.compare:
+        regressions = compare(suite.results, json.loads(args.compare.read_text()), args.threshold)
+        report['baseline'] = str(args.compare)
+        report['regressions'] = regressions
+
+    out = args.out or RESULTS_DIR / f"{created:%Y%m%dT%H%M%S}-{commit or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f'\nwrote {out}')
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) slower than {args.threshold}x the baseline')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.data import COLUMNS, DATA_PATH
+from core.regions import AGGREGATES
+
+# Synthetic datasets for the benchmarks. A dataset scaled N times keeps every
+# row of the real CSV and adds N-1 jittered copies of each country's rows
+# under new region names ('Norway #2', 'Norway #3', ...). Aggregates (World,
+# Europe, ...) are not copied, so the hierarchy stays intact and the number of
+# regions grows with the scale the way a larger dataset would.
+
+DATA_DIR = Path(__file__).resolve().parent / '.data'
+SEED = 20240101
+
+
+def dataset_path(scale, source=DATA_PATH):
+    if scale == 1:
+        return Path(source)
+    return DATA_DIR / f'{Path(source).stem}_x{scale}.csv'
+
+
+def make_dataset(scale, source=DATA_PATH):
+    """Write (once) and return the path of ``source`` scaled ``scale`` times."""
+    target = dataset_path(scale, source)
+    if scale == 1 or (target.exists() and target.stat().st_mtime >= Path(source).stat().st_mtime):
+        return target
+    df = pd.read_csv(source)
+    countries = df[~df['region'].isin(AGGREGATES)]
+    rng = np.random.default_rng(SEED + scale)
+    copies = [df]
+    for copy in range(2, scale + 1):
+        jitter = rng.uniform(0.8, 1.2, len(countries))
+        value = countries['value'] * jitter
+        # shares are percentages and must stay in range
+        value = value.where(countries['unit'] != 'percent', value.clip(upper=100))
+        copies.append(countries.assign(region=countries['region'] + f' #{copy}', value=value))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix('.tmp')
+    pd.concat(copies, ignore_index=True)[COLUMNS].to_csv(tmp, index=False)
+    tmp.replace(target)
+    return target
+
+
+if __name__ == '__main__':
+    import sys
+
+    for arg in sys.argv[1:] or ['1', '10', '100']:
+        print(make_dataset(int(arg)))
@@ -0,0 +1,324 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.data import (
+    CACHE_DIR, COLUMNS, DATA_PATH, DEFAULT_PARTITION, KEY_COLUMNS, delta_dir, delta_signatures, file_signature,
+    get_data, list_partitions, read_delta
+)
+from core.metrics import timer
+from core.regions import dimension
+
+# Pluggable query backends for the dashboard. Both expose the same interface
+# as SalesCube/Selection (``select``, ``by_year``, ``by_region`` ...), so the
+# dashboard code doesn't care which one answers:
+#   pandas  the in-memory SalesCube built by core.data (default)
+#   duckdb  embedded DuckDB over a Parquet copy of the dataset; filters and
+#           group-bys run as SQL and only the small result frames reach Python,
+#           so memory stays flat as the dataset grows
+BACKEND = os.getenv('EV_DASHBOARD_BACKEND', 'pandas')
+BACKENDS = ('pandas', 'duckdb')
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QuerySource:
+    """What the dashboard needs from a backend: a version ``signature``, the ``partition`` and a ``cube``."""
+    signature: tuple
+    partition: tuple
+    cube: object
+
+
+def sql_string(value):
+    """``value`` as a quoted SQL string literal, for the spots DuckDB doesn't take a bound parameter."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def parquet_path(path, signature):
+    return CACHE_DIR / f'{Path(path).stem}-{signature[0]}-{signature[1]}.parquet'
+
+
+def write_parquet(con, path, signature):
+    """Convert the CSV at ``path`` to Parquet with DuckDB's own reader, without pandas."""
+    target = parquet_path(path, signature)
+    if target.exists():
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f'.{os.getpid()}.tmp')
+    # sorted so row-group min/max stats let filtered scans skip most of the file;
+    # COPY's target can't be a parameter
+    con.execute(
+        f"COPY (SELECT {', '.join(COLUMNS)} FROM read_csv(?, header = true) "
+        f"ORDER BY mode, category, parameter, region, year) TO {sql_string(tmp)} (FORMAT parquet)",
+        [str(path)],
+    )
+    os.replace(tmp, target)
+    for stale in target.parent.glob(f'{Path(path).stem}-*.parquet'):
+        if stale != target:
+            stale.unlink(missing_ok=True)
+    return target
+
+
+def _rows_sql(base, deltas):
+    # a view body can't hold parameters, so the paths go in as escaped literals
+    if not deltas:
+        return f"SELECT * FROM read_parquet({sql_string(base)})"
+    # later files win for rows with the same key, as in core.data.apply_delta
+    parts = [f"SELECT {', '.join(COLUMNS)}, 0 AS src FROM read_parquet({sql_string(base)})"]
+    parts += [
+        f"SELECT {', '.join(COLUMNS)}, {i} AS src FROM read_csv({sql_string(delta)}, header = true)"
+        for i, delta in enumerate(deltas, 1)
+    ]
+    return (
+        f"SELECT {', '.join(COLUMNS)} FROM ({' UNION ALL '.join(parts)}) "
+        f"QUALIFY row_number() OVER (PARTITION BY {', '.join(KEY_COLUMNS)} ORDER BY src DESC) = 1"
+    )
+
+
+def create_views(con, rows_sql):
+    con.execute(f'CREATE OR REPLACE VIEW ev AS {rows_sql}')
+    # mode/category stay grouping keys so partition filters push down to the Parquet scan
+    con.execute(
+        "CREATE OR REPLACE VIEW sales AS SELECT mode, category, year, region, powertrain, SUM(value) AS Vehicles "
+        "FROM ev WHERE parameter = 'EV sales' AND unit = 'Vehicles' GROUP BY ALL"
+    )
+    con.execute(
+        "CREATE OR REPLACE VIEW share AS SELECT mode, category, year, region, SUM(value) AS percent "
+        "FROM ev WHERE parameter = 'EV sales share' AND unit = 'percent' GROUP BY ALL"
+    )
+
+
+class DuckDBCube:
+    """SalesCube look-alike for one (mode, category) partition; aggregates are SQL queries."""
+
+    def __init__(self, con, partition):
+        self.con = con
+        self.partition = tuple(partition)
+        sales, share = self.table('sales'), self.table('share')
+        axes = f'SELECT year, region FROM {sales} UNION SELECT year, region FROM {share}'
+        self.years = pd.Index(self._column(f'SELECT DISTINCT year FROM ({axes}) ORDER BY 1'), name='year')
+        self.regions = pd.Index(self._column(f'SELECT DISTINCT region FROM ({axes}) ORDER BY 1'), name='region')
+        self.powertrains = pd.Index(
+            self._column(f'SELECT DISTINCT powertrain FROM {sales} ORDER BY 1'), name='powertrain'
+        )
+        self.dim = dimension(self.regions)
+        # the sidebar asks for these on every rerun; they only change with the data
+        self._region_order = self._column(f'SELECT region FROM {sales} GROUP BY region ORDER BY MIN(year), region')
+        self._powertrain_order = self._column(
+            'SELECT powertrain FROM (SELECT powertrain, row_number() OVER (ORDER BY year, region, powertrain) AS n '
+            f'FROM {sales}) GROUP BY powertrain ORDER BY MIN(n)'
+        )
+
+    def table(self, view):
+        """Subquery over ``view`` restricted to this cube's partition."""
+        mode, category = map(sql_string, self.partition)
+        return f"(SELECT * FROM {view} WHERE mode = {mode} AND category = {category})"
+
+    def query(self, sql, params=None):
+        # a cursor per call keeps concurrent sessions off each other's result sets
+        return self.con.cursor().execute(sql, params or []).df()
+
+    def _column(self, sql, params=None):
+        return self.query(sql, params).iloc[:, 0].tolist()
+
+    def region_order(self):
+        return list(self._region_order)
+
+    def powertrain_order(self):
+        return list(self._powertrain_order)
+
+    def dense(self):
+        """``(sales, present, share)`` arrays over the cube's axes, like SalesCube's, from two grouped queries."""
+        sales = np.zeros((len(self.years), len(self.regions), len(self.powertrains)))
+        present = np.zeros(sales.shape, dtype=bool)
+        share = np.full((len(self.years), len(self.regions)), np.nan)
+        frame = self.query(f'SELECT year, region, powertrain, SUM(Vehicles) AS v FROM {self.table("sales")} GROUP BY ALL')
+        y, r, p = (self.years.get_indexer(frame['year']), self.regions.get_indexer(frame['region']),
+                   self.powertrains.get_indexer(frame['powertrain']))
+        sales[y, r, p] = frame['v'].to_numpy(dtype=float)
+        present[y, r, p] = True
+        frame = self.query(f'SELECT year, region, SUM(percent) AS v FROM {self.table("share")} GROUP BY ALL')
+        share[self.years.get_indexer(frame['year']), self.regions.get_indexer(frame['region'])] = frame['v']
+        return sales, present, share
+
+    def select(self, regions=None, powertrains=None):
+        return DuckDBSelection(
+            self,
+            None if regions is None else tuple(r for r in self.regions if r in set(regions)),
+            None if powertrains is None else tuple(p for p in self.powertrains if p in set(powertrains)),
+        )
+
+
+@dataclass(frozen=True)
+class DuckDBSelection:
+    cube: DuckDBCube
+    region_list: tuple = None       # None = all regions
+    powertrain_list: tuple = None   # None = all powertrains
+
+    @property
+    def regions(self):
+        if self.region_list is None:
+            return self.cube.regions
+        return self.cube.regions[self.cube.regions.isin(self.region_list)]
+
+    @property
+    def powertrains(self):
+        if self.powertrain_list is None:
+            return self.cube.powertrains
+        return self.cube.powertrains[self.cube.powertrains.isin(self.powertrain_list)]
+
+    def _where(self, powertrains=True):
+        clauses, params = ['TRUE'], []
+        if self.region_list is not None:
+            clauses.append('list_contains(?, region)')
+            params.append(list(self.region_list))
+        if powertrains and self.powertrain_list is not None:
+            clauses.append('list_contains(?, powertrain)')
+            params.append(list(self.powertrain_list))
+        return ' AND '.join(clauses), params
+
+    def _sales(self, select, group=None):
+        where, params = self._where()
+        sql = f"SELECT {select} FROM {self.cube.table('sales')} WHERE {where}"
+        if group:
+            sql += f' GROUP BY {group} ORDER BY {group}'
+        return self.cube.query(sql, params)
+
+    def _with_mask(self, mask):
+        return DuckDBSelection(self.cube, tuple(self.cube.regions[mask]), self.powertrain_list)
+
+    def top_level(self):
+        return self._with_mask(self.cube.dim.top_level(self.cube.regions.isin(self.regions)))
+
+    def finest(self):
+        return self._with_mask(self.cube.dim.finest(self.cube.regions.isin(self.regions)))
+
+    def countries(self):
+        return self._with_mask(self.cube.regions.isin(self.regions) & ~self.cube.dim.aggregate)
+
+    def subset(self, include=None, exclude=None):
+        regions = list(self.regions)
+        if include is not None:
+            regions = [r for r in regions if r in set(include)]
+        if exclude is not None:
+            regions = [r for r in regions if r not in set(exclude)]
+        return DuckDBSelection(self.cube, tuple(regions), self.powertrain_list)
+
+    @property
+    def empty(self):
+        return int(self._sales('COUNT(*)').iloc[0, 0]) == 0
+
+    def total(self):
+        return float(self._sales('COALESCE(SUM(Vehicles), 0)').iloc[0, 0])
+
+    def by_year(self):
+        frame = self._sales('year, SUM(Vehicles) AS Vehicles', 'year')
+        return pd.Series(frame['Vehicles'].to_numpy(dtype=float), index=pd.Index(frame['year'], name='year'),
+                         name='Vehicles')
+
+    def by_region(self):
+        frame = self._sales('region, SUM(Vehicles) AS Vehicles', 'region')
+        return pd.Series(frame['Vehicles'].to_numpy(dtype=float), index=pd.Index(frame['region'], name='region'),
+                         name='Vehicles')
+
+    def by_year_region(self):
+        frame = self._sales('year, region, SUM(Vehicles) AS Vehicles', 'year, region')
+        wide = frame.pivot(index='year', columns='region', values='Vehicles')
+        return wide.reindex(index=self.cube.years, columns=self.regions).fillna(0.0)
+
+    def by_year_powertrain(self):
+        frame = self._sales('year, powertrain, SUM(Vehicles) AS Vehicles', 'year, powertrain')
+        wide = frame.pivot(index='year', columns='powertrain', values='Vehicles')
+        wide = wide.reindex(columns=[p for p in self.cube.powertrains if p in wide.columns]).astype(float)
+        wide.index = pd.Index(wide.index, name='year')
+        wide.columns = pd.Index(wide.columns, name='powertrain')
+        return wide
+
+    def region_count(self):
+        return int(self._sales('COUNT(DISTINCT region)').iloc[0, 0])
+
+    def avg_share(self):
+        where, params = self._where(powertrains=False)
+        value = self.cube.query(f"SELECT AVG(percent) FROM {self.cube.table('share')} WHERE {where}", params).iloc[0, 0]
+        return np.nan if pd.isna(value) else float(value)
+
+
+def require_duckdb():
+    """Import duckdb on first use, so processes on the pandas backend never load it."""
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError('the duckdb backend needs the duckdb package (pip install duckdb)') from None
+    return duckdb
+
+
+_connections = {}
+_sources = {}
+_lock = threading.Lock()
+
+
+def _connect(path, signature):
+    """One in-memory DuckDB database per data version, shared by all of its partitions."""
+    cached = _connections.get(path)
+    if cached is None or cached[0] != signature:
+        con = require_duckdb().connect()
+        base = write_parquet(con, path, signature[0])
+        deltas = []
+        for name, *_ in signature[1]:
+            try:
+                read_delta(delta_dir(path) / name)
+            except (OSError, ValueError) as e:
+                logger.error('skipping delta %s: %s', name, e)
+                continue
+            deltas.append(delta_dir(path) / name)
+        create_views(con, _rows_sql(base, deltas))
+        cached = _connections[path] = (signature, con)
+    return cached[1]
+
+
+def get_duckdb_source(path=DATA_PATH, partition=DEFAULT_PARTITION):
+    """Return the DuckDB-backed source for one partition of ``path``, rebuilt when the CSV or its deltas change."""
+    require_duckdb()
+    path = str(path)
+    partition = tuple(partition)
+    signature = (file_signature(path), delta_signatures(path))
+    source = _sources.get((path, partition))
+    if source is not None and source.signature == signature:
+        return source
+    with _lock:
+        source = _sources.get((path, partition))
+        if source is None or source.signature != signature:
+            with timer('load', partition='/'.join(partition), backend='duckdb'):
+                source = QuerySource(signature, partition, DuckDBCube(_connect(path, signature), partition))
+            _sources[(path, partition)] = source
+    return source
+
+
+def get_partitions(path=DATA_PATH, backend=None):
+    """``(mode, category)`` pairs with EV sales rows, without loading any partition."""
+    backend = backend or BACKEND
+    if backend == 'duckdb':
+        require_duckdb()
+        path = str(path)
+        signature = (file_signature(path), delta_signatures(path))
+        with _lock:
+            con = _connect(path, signature)
+        rows = con.cursor().execute('SELECT DISTINCT mode, category FROM sales ORDER BY 1, 2').fetchall()
+        return [tuple(row) for row in rows]
+    return list_partitions(path)
+
+
+def get_source(path=DATA_PATH, backend=None, partition=DEFAULT_PARTITION):
+    """Return the dashboard's query source for one partition and the configured (or given) backend."""
+    backend = backend or BACKEND
+    if backend == 'pandas':
+        return get_data(path, partition)
+    if backend == 'duckdb':
+        return get_duckdb_source(path, partition)
+    raise ValueError(f'unknown backend {backend!r}; expected one of {BACKENDS}')
@@ -0,0 +1,239 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import pandas as pd
+
+from core.data import ROOT_DIR
+from core.metrics import timer
+
+# Campaign store. Campaigns and the promotional texts generated for them live
+# in SQLite (WAL, so readers never block the writer), indexed by region and
+# creation time. Writes from every session in the process go through one
+# writer thread that commits whatever has queued up in a single transaction,
+# so many users saving at once cost one commit instead of one each. Listing
+# pages by (created, id) keyset, so deep pages are as cheap as the first.
+
+STORE_PATH = ROOT_DIR / 'data' / 'campaigns.sqlite'
+LEGACY_CSV = ROOT_DIR / 'data' / 'campaigns.csv'
+PAGE_SIZE = 20
+MAX_BATCH = 500         # queued writes committed per transaction, at most
+WRITE_TIMEOUT = 30      # seconds a caller waits for its write to commit
+SCHEMA_VERSION = 1
+
+CAMPAIGN_COLUMNS = ['id', 'region', 'description', 'tagline', 'budget', 'source', 'created']
+PROMOTION_COLUMNS = ['id', 'campaign_id', 'region', 'content_type', 'model', 'text', 'created']
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS campaigns ('
+    ' id INTEGER PRIMARY KEY, region TEXT NOT NULL, description TEXT, tagline TEXT,'
+    ' budget REAL, source TEXT, created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS campaigns_region ON campaigns (region, created, id)',
+    'CREATE INDEX IF NOT EXISTS campaigns_created ON campaigns (created, id)',
+    'CREATE INDEX IF NOT EXISTS campaigns_budget ON campaigns (budget)',
+    'CREATE TABLE IF NOT EXISTS promotions ('
+    ' id INTEGER PRIMARY KEY, campaign_id INTEGER REFERENCES campaigns (id) ON DELETE CASCADE,'
+    ' region TEXT NOT NULL, content_type TEXT, model TEXT, text TEXT, created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS promotions_campaign ON promotions (campaign_id, created)',
+    'CREATE INDEX IF NOT EXISTS promotions_region ON promotions (region, created)',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class CampaignStore:
+    def __init__(self, path=STORE_PATH, legacy_csv=LEGACY_CSV):
+        self.path = path
+        self.legacy_csv = legacy_csv
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def _connect(self):
+        # one short-lived connection per read keeps this safe across threads
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA foreign_keys = ON')
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    self._migrate(conn)
+                    self._ready = True
+        return conn
+
+    def _migrate(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self._import_legacy(conn)
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _import_legacy(self, conn):
+        """Copy the rows of the old append-only campaigns.csv, once."""
+        if self.legacy_csv is None or not self.legacy_csv.exists():
+            return
+        try:
+            legacy = pd.read_csv(self.legacy_csv)
+        except (OSError, ValueError) as e:
+            logger.warning('could not import %s: %s', self.legacy_csv, e)
+            return
+        created = self.legacy_csv.stat().st_mtime
+        conn.executemany(
+            'INSERT INTO campaigns (region, description, tagline, budget, source, created) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (row.Region, row.Description, row.Tagline, float(row.Budget), 'csv', created)
+                for row in legacy.itertuples(index=False)
+            ],
+        )
+        logger.info('imported %d campaigns from %s', len(legacy), self.legacy_csv)
+
+    def _submit(self, sql, rows):
+        """Queue ``rows`` for ``sql`` and wait until they are committed; returns their row ids."""
+        future = Future()
+        self._queue.put((sql, rows, future))
+        with self._init_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='campaign-writer', daemon=True)
+                self._writer.start()
+        return future.result(timeout=WRITE_TIMEOUT)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][1])
+            while count < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                count += len(batch[-1][1])
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            conn = self._connect()
+            try:
+                with conn, timer('campaign_write'):
+                    results = [[conn.execute(sql, row).lastrowid for row in rows] for sql, rows, _ in batch]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            if len(batch) > 1:
+                # one bad request shouldn't fail everyone else's; retry them one by one
+                for item in batch:
+                    self._commit([item])
+                return
+            batch[0][2].set_exception(e)
+            return
+        for (_, _, future), ids in zip(batch, results):
+            future.set_result(ids)
+
+    def add_campaigns(self, campaigns, source='form'):
+        """Save ``{'region', 'description', 'tagline', 'budget'}`` dicts in one transaction; returns their ids."""
+        now = time.time()
+        return self._submit(
+            'INSERT INTO campaigns (region, description, tagline, budget, source, created) VALUES (?, ?, ?, ?, ?, ?)',
+            [(c['region'], c.get('description'), c.get('tagline'), c.get('budget'), source, now) for c in campaigns],
+        )
+
+    def add_campaign(self, region, description, tagline, budget, source='form'):
+        return self.add_campaigns(
+            [{'region': region, 'description': description, 'tagline': tagline, 'budget': budget}], source
+        )[0]
+
+    def add_promotions(self, promotions):
+        """Save ``{'campaign_id', 'region', 'content_type', 'model', 'text'}`` dicts in one transaction."""
+        now = time.time()
+        return self._submit(
+            'INSERT INTO promotions (campaign_id, region, content_type, model, text, created) VALUES (?, ?, ?, ?, ?, ?)',
+            [(p.get('campaign_id'), p['region'], p.get('content_type'), p.get('model'), p['text'], now)
+             for p in promotions],
+        )
+
+    def _query(self, sql, params=(), columns=None):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            rows = cursor.fetchall()
+            columns = columns or [d[0] for d in cursor.description]
+        finally:
+            conn.close()
+        return pd.DataFrame.from_records(rows, columns=columns)
+
+    def list_campaigns(self, regions=None, min_budget=None, max_budget=None, search=None, after=None,
+                       limit=PAGE_SIZE):
+        """One page of campaigns, newest first, and the cursor for the next page (None on the last).
+
+        ``after`` is the cursor returned with the previous page. ``search``
+        matches the region, description or tagline.
+        """
+        clauses, params = [], []
+        if regions:
+            clauses.append(f"region IN ({', '.join('?' * len(regions))})")
+            params += list(regions)
+        if min_budget is not None:
+            clauses.append('budget >= ?')
+            params.append(min_budget)
+        if max_budget is not None:
+            clauses.append('budget <= ?')
+            params.append(max_budget)
+        if search:
+            pattern = f'%{_escape_like(search)}%'
+            clauses.append("(region LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' OR tagline LIKE ? ESCAPE '\\')")
+            params += [pattern] * 3
+        if after is not None:
+            clauses.append('(created < ? OR (created = ? AND id < ?))')
+            params += [after[0], after[0], after[1]]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with timer('campaign_query'):
+            page = self._query(
+                f"SELECT {', '.join(CAMPAIGN_COLUMNS)}, "
+                '(SELECT COUNT(*) FROM promotions WHERE campaign_id = campaigns.id) AS promotions '
+                f'FROM campaigns {where} ORDER BY created DESC, id DESC LIMIT ?',
+                [*params, limit + 1],
+                [*CAMPAIGN_COLUMNS, 'promotions'],
+            )
+        cursor = None
+        if len(page) > limit:
+            page = page.iloc[:limit]
+            cursor = (float(page['created'].iloc[-1]), int(page['id'].iloc[-1]))
+        return page, cursor
+
+    def promotions_for(self, campaign_ids):
+        """Promotions generated for ``campaign_ids``, newest first."""
+        campaign_ids = [int(i) for i in campaign_ids]
+        if not campaign_ids:
+            return pd.DataFrame(columns=PROMOTION_COLUMNS)
+        return self._query(
+            f"SELECT {', '.join(PROMOTION_COLUMNS)} FROM promotions "
+            f"WHERE campaign_id IN ({', '.join('?' * len(campaign_ids))}) ORDER BY created DESC, id DESC",
+            campaign_ids,
+            PROMOTION_COLUMNS,
+        )
+
+    def regions(self):
+        """Regions with at least one campaign (answered from the region index)."""
+        return self._query('SELECT DISTINCT region FROM campaigns ORDER BY region', columns=['region'])['region'].tolist()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_campaign_store():
+    """Return the process-wide store, so every session shares one writer."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = CampaignStore()
+    return _default
@@ -0,0 +1,186 @@
+import logging
+
+from core.llm import MODEL, complete
+
+# Conversation memory for the chatbot. Each request carries the most recent
+# turns that fit a token budget; older turns are folded into a running
+# summary, and the stored history per session is capped so neither prompt
+# size nor session memory grows with the length of a conversation. Once the
+# budget is exceeded, turns are folded down to a low-water mark (half the
+# budget), so the summary call happens every few questions rather than every
+# one. The chatbot runs that call as a background job (core.jobs) after a
+# reply has streamed, and the next request picks up the new summary if it is
+# ready, so neither the finished answer nor the next one waits on it.
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = 1024
+LOW_WATER = 0.5  # share of the budget the recent turns are folded down to
+SUMMARY_TOKEN_BUDGET = 200
+MAX_STORED_MESSAGES = 50
+
+SUMMARY_OPTIONS = {
+    'temperature': 0.2,
+    'num_predict': SUMMARY_TOKEN_BUDGET,
+}
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text with Llama tokenizers
+    return max(1, len(text) // 4)
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(m['content']) + 4 for m in messages)
+
+
+def _truncate(text, tokens):
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def extractive_summary(summary, turns):
+    """Fallback summary: the start of each folded turn, trimmed to the budget."""
+    lines = [summary] if summary else []
+    lines += [f"{m['role']}: {_truncate(m['content'], 40)}" for m in turns]
+    return _truncate('\n'.join(lines), SUMMARY_TOKEN_BUDGET)
+
+
+def llm_summary(summary, turns):
+    transcript = '\n'.join(f"{m['role']}: {m['content']}" for m in turns)
+    messages = [
+        {
+            'role': 'system',
+            'content': 'Summarize the conversation so far in at most 120 words. Keep regions, years, '
+                       'numbers and open questions; drop pleasantries.'
+        },
+        {
+            'role': 'user',
+            'content': (f"Earlier summary:\n{summary}\n\n" if summary else '') + f"New turns:\n{transcript}"
+        },
+    ]
+    try:
+        return complete(MODEL, messages, SUMMARY_OPTIONS)
+    except Exception as e:
+        logger.warning('conversation summary failed, using extractive fallback: %s', e)
+        return extractive_summary(summary, turns)
+
+
+class ConversationMemory:
+    """Bounded chat history kept in a dict-like ``state`` (e.g. st.session_state).
+
+    ``state['messages']`` holds the displayed turns, ``state['chat_summary']``
+    the running summary and ``state['chat_summarized']`` how many leading
+    messages it already covers.
+    """
+
+    def __init__(self, state, budget=HISTORY_TOKEN_BUDGET, max_stored=MAX_STORED_MESSAGES,
+                 summarizer=llm_summary, low_water=LOW_WATER):
+        self.state = state
+        self.budget = budget
+        self.low_water = int(budget * low_water)
+        self.max_stored = max_stored
+        self.summarizer = summarizer
+        state.setdefault('messages', [])
+        state.setdefault('chat_summary', '')
+        state.setdefault('chat_summarized', 0)
+
+    @property
+    def messages(self):
+        return self.state['messages']
+
+    @property
+    def summary(self):
+        return self.state['chat_summary']
+
+    def _fold(self, upto):
+        """Fold messages[summarized:upto] into the running summary."""
+        start = self.state['chat_summarized']
+        if upto <= start:
+            return
+        self.state['chat_summary'] = self.summarizer(self.summary, self.messages[start:upto])
+        self.state['chat_summarized'] = upto
+
+    def fold_point(self):
+        """How many leading messages to fold, or None while the recent turns fit the budget.
+
+        Turns are folded down to the low-water mark, leaving room to grow
+        before the next fold.
+        """
+        start = self.state['chat_summarized']
+        turns = self.messages[start:]
+        if message_tokens(turns) <= self.budget:
+            return None
+        used = 0
+        keep = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            used += message_tokens([turns[i]])
+            if used > self.low_water:
+                break
+            keep = i
+        return start + keep
+
+    def compact(self):
+        """Fold older turns into the summary now, if the recent ones exceed the budget."""
+        upto = self.fold_point()
+        if upto is not None:
+            self._fold(upto)
+
+    def compact_later(self, submit):
+        """Like compact(), but the summary is computed by ``submit(summarizer, summary, turns)``.
+
+        ``submit`` starts the call in the background and returns its job
+        (core.jobs.Job); the summary is applied by the first window() after
+        the job has finished.
+        """
+        self.collect()
+        upto = self.fold_point()
+        if upto is None or 'chat_folding' in self.state:
+            return
+        start = self.state['chat_summarized']
+        job = submit(self.summarizer, self.summary, self.messages[start:upto])
+        self.state['chat_folding'] = (job, start, upto)
+
+    def collect(self):
+        """Apply a finished background fold; returns False while one is still running."""
+        folding = self.state.get('chat_folding')
+        if folding is None:
+            return True
+        job, start, upto = folding
+        if job.pending:
+            return False
+        del self.state['chat_folding']
+        # a fold that happened meanwhile (stored-history overflow) supersedes this one
+        if job.error is None and job.result is not None and self.state['chat_summarized'] == start:
+            self.state['chat_summary'] = job.result
+            self.state['chat_summarized'] = upto
+        return True
+
+    def window(self):
+        """Return ``(summary, recent_turns)`` to send with the next request.
+
+        While a background fold is still running the turns go out as they
+        are rather than waiting for it.
+        """
+        if self.collect():
+            self.compact()
+        return self.summary, self.messages[self.state['chat_summarized']:]
+
+    def append(self, role, content):
+        self.messages.append({'role': role, 'content': content})
+        overflow = len(self.messages) - self.max_stored
+        if overflow > 0:
+            # never drop turns the summary hasn't absorbed yet
+            self._fold(overflow)
+            del self.messages[:overflow]
+            self.state['chat_summarized'] -= overflow
+
+    def prompt_messages(self, system, context, question):
+        """Assemble the full message list for ``question`` within the budget."""
+        summary, turns = self.window()
+        messages = [{'role': 'system', 'content': system}, {'role': 'user', 'content': context}]
+        if summary:
+            messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+        messages += [{'role': m['role'], 'content': m['content']} for m in turns]
+        messages.append({'role': 'user', 'content': f"Answer this: {question}"})
+        return messages
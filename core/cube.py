@@ -0,0 +1,187 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from core.regions import RegionDim, dimension
+
+# Dense year x region x powertrain cube built once per data load. Sidebar
+# selections become boolean masks over the region/powertrain axes, so every
+# KPI and chart aggregate is a masked sum over the cube instead of a
+# DataFrame.query + groupby over raw rows.
+
+
+@dataclass(frozen=True)
+class SalesCube:
+    years: pd.Index
+    regions: pd.Index
+    powertrains: pd.Index
+    sales: np.ndarray     # (year, region, powertrain) vehicles, 0 where missing
+    present: np.ndarray   # (year, region, powertrain) True where a row exists
+    share: np.ndarray     # (year, region) EV sales share in percent, NaN where missing
+    dim: RegionDim        # region dimension table aligned to ``regions``
+
+    def region_mask(self, regions=None):
+        if regions is None:
+            return np.ones(len(self.regions), dtype=bool)
+        return self.regions.isin(list(regions))
+
+    def powertrain_mask(self, powertrains=None):
+        if powertrains is None:
+            return np.ones(len(self.powertrains), dtype=bool)
+        return self.powertrains.isin(list(powertrains))
+
+    def region_order(self):
+        """Regions with sales rows, ordered by first year with sales (then name)."""
+        present = self.present.any(axis=2)
+        rows = present.any(axis=0)
+        first = np.where(rows, present.argmax(axis=0), len(self.years))
+        order = np.argsort(first, kind='stable')
+        return list(self.regions[order[rows[order]]])
+
+    def powertrain_order(self):
+        """Powertrains ordered by first (year, region) with sales, as in the pivoted table."""
+        present = self.present.reshape(-1, len(self.powertrains))
+        rows = present.any(axis=0)
+        order = np.argsort(np.where(rows, present.argmax(axis=0), len(present)), kind='stable')
+        return list(self.powertrains[order[rows[order]]])
+
+    def dense(self):
+        """``(sales, present, share)`` arrays over the cube's axes."""
+        return self.sales, self.present, self.share
+
+    def select(self, regions=None, powertrains=None):
+        """Return a Selection for the given regions/powertrains (None = all)."""
+        return Selection(self, self.region_mask(regions), self.powertrain_mask(powertrains))
+
+    def merge(self, sales_df, sales_share_df, partitions):
+        """Return a cube with the (year, region) ``partitions`` replaced by the given pivots.
+
+        Axes grow to include any new years, regions or powertrains; cells
+        outside ``partitions`` are copied unchanged.
+        """
+        part = build_cube(sales_df, sales_share_df)
+        years = self.years.union(part.years).rename('year')
+        regions = self.regions.union(part.regions).rename('region')
+        powertrains = self.powertrains.union(part.powertrains).rename('powertrain')
+
+        sales = np.zeros((len(years), len(regions), len(powertrains)))
+        present = np.zeros(sales.shape, dtype=bool)
+        share = np.full((len(years), len(regions)), np.nan)
+        y, r, p = (np.ix_(years.get_indexer(self.years), regions.get_indexer(self.regions),
+                          powertrains.get_indexer(self.powertrains)))
+        sales[y, r, p] = self.sales
+        present[y, r, p] = self.present
+        share[y[..., 0], r[..., 0]] = self.share
+
+        y = years.get_indexer(partitions.get_level_values(0))
+        r = regions.get_indexer(partitions.get_level_values(1))
+        y, r = y[(y >= 0) & (r >= 0)], r[(y >= 0) & (r >= 0)]
+        sales[y, r] = 0
+        present[y, r] = False
+        share[y, r] = np.nan
+
+        y, r, p = (np.ix_(years.get_indexer(part.years), regions.get_indexer(part.regions),
+                          powertrains.get_indexer(part.powertrains)))
+        sales[y, r, p] += np.where(part.present, part.sales, 0)
+        present[y, r, p] |= part.present
+        share[y[..., 0], r[..., 0]] = np.where(np.isnan(part.share), share[y[..., 0], r[..., 0]], part.share)
+        return SalesCube(years, regions, powertrains, sales, present, share, dimension(regions))
+
+
+@dataclass(frozen=True)
+class Selection:
+    cube: SalesCube
+    region_mask: np.ndarray
+    powertrain_mask: np.ndarray
+
+    @property
+    def sales(self):
+        return self.cube.sales[:, self.region_mask][:, :, self.powertrain_mask]
+
+    @property
+    def present(self):
+        return self.cube.present[:, self.region_mask][:, :, self.powertrain_mask]
+
+    @property
+    def regions(self):
+        return self.cube.regions[self.region_mask]
+
+    @property
+    def powertrains(self):
+        return self.cube.powertrains[self.powertrain_mask]
+
+    def top_level(self):
+        """Only the regions not already contained in another selected region, for totals."""
+        return Selection(self.cube, self.cube.dim.top_level(self.region_mask), self.powertrain_mask)
+
+    def finest(self):
+        """Only the regions with no selected members, for breakdowns by region."""
+        return Selection(self.cube, self.cube.dim.finest(self.region_mask), self.powertrain_mask)
+
+    def countries(self):
+        return Selection(self.cube, self.region_mask & ~self.cube.dim.aggregate, self.powertrain_mask)
+
+    def subset(self, include=None, exclude=None):
+        """Narrow the region axis further, e.g. ``subset(exclude=['World'])``."""
+        mask = self.region_mask & self.cube.region_mask(include)
+        if exclude is not None:
+            mask = mask & ~self.cube.regions.isin(list(exclude))
+        return Selection(self.cube, mask, self.powertrain_mask)
+
+    @property
+    def empty(self):
+        return not self.present.any()
+
+    def total(self):
+        return float(self.sales.sum())
+
+    def by_year(self):
+        """Sales per year, limited to years that have at least one row."""
+        present = self.present.any(axis=(1, 2))
+        return pd.Series(self.sales.sum(axis=(1, 2))[present], index=self.cube.years[present], name='Vehicles')
+
+    def by_region(self):
+        present = self.present.any(axis=(0, 2))
+        return pd.Series(self.sales.sum(axis=(0, 2))[present], index=self.regions[present], name='Vehicles')
+
+    def by_year_region(self):
+        """Dense (year, region) sales frame over the selected regions, zeros where missing."""
+        return pd.DataFrame(self.sales.sum(axis=2), index=self.cube.years, columns=self.regions)
+
+    def by_year_powertrain(self):
+        """Wide year x powertrain sales, NaN where a combination has no rows."""
+        present = self.present.any(axis=1)
+        values = np.where(present, self.sales.sum(axis=1), np.nan)
+        rows = present.any(axis=1)
+        cols = present.any(axis=0)
+        return pd.DataFrame(values[rows][:, cols], index=self.cube.years[rows], columns=self.powertrains[cols])
+
+    def region_count(self):
+        return int(self.present.any(axis=(0, 2)).sum())
+
+    def avg_share(self):
+        share = self.cube.share[:, self.region_mask]
+        if np.isnan(share).all():
+            return np.nan
+        return float(np.nanmean(share))
+
+
+def build_cube(sales_df, sales_share_df):
+    years = pd.Index(sorted(set(sales_df['year']) | set(sales_share_df['year'])), name='year')
+    regions = pd.Index(sorted(set(sales_df['region']) | set(sales_share_df['region'])), name='region')
+    powertrains = pd.Index(sorted(sales_df['powertrain'].unique()), name='powertrain')
+
+    y = years.get_indexer(sales_df['year'])
+    r = regions.get_indexer(sales_df['region'])
+    p = powertrains.get_indexer(sales_df['powertrain'])
+    sales = np.zeros((len(years), len(regions), len(powertrains)))
+    present = np.zeros(sales.shape, dtype=bool)
+    np.add.at(sales, (y, r, p), sales_df['Vehicles'].fillna(0).to_numpy(dtype=float))
+    present[y, r, p] = True
+
+    share = np.full((len(years), len(regions)), np.nan)
+    share[years.get_indexer(sales_share_df['year']), regions.get_indexer(sales_share_df['region'])] = (
+        sales_share_df['percent'].to_numpy(dtype=float)
+    )
+    return SalesCube(years, regions, powertrains, sales, present, share, dimension(regions))
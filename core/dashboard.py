@@ -0,0 +1,467 @@
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from core.data import DEFAULT_PARTITION
+from core.forecast import get_forecast, trend_growth
+from core.memo import get_cache
+from core.metrics import timer
+from core.payload import compact_json, dumps
+
+# KPI and figure builders for the sales dashboard. Results are memoized per
+# canonical sidebar selection in a process-wide LRU cache, so sessions that
+# land on the same filters (shared links, defaults) reuse the same KPIs and
+# figure JSON instead of rebuilding them. The JSON is compacted by
+# core.payload (downsampled long lines, rounded numbers) before it's cached.
+# plotly is imported inside the figure builders, so pages that only need the
+# KPIs (the chatbot) never load it.
+
+MAP_TITLE = 'Global EV Sales Map'
+
+# Figure titles double as the section titles in the PDF report
+FIGURE_TITLES = [
+    'Global EV Sales',
+    'EV Sales by Country',
+    'Powertrain Trends',
+    'Regional Sales Breakdown',
+    'Year-over-Year Sales Growth',
+    MAP_TITLE,
+]
+
+dashboard_cache = get_cache('dashboard', max_entries=256, max_bytes=512 * 1024 * 1024)
+map_frame_cache = get_cache('map_frames', max_entries=4096, max_bytes=256 * 1024 * 1024)
+
+
+def canonical_key(regions, powertrains):
+    """Normalize a sidebar selection so equivalent selections share a cache entry.
+
+    Regions only filter when something other than "Select All" alone is
+    picked, and powertrains only matter once regions filter; the key mirrors
+    that so e.g. every unfiltered view maps to ``(None, None)``.
+    """
+    if not regions or list(regions) == ["Select All"]:
+        return None, None
+    return (
+        tuple(sorted({r for r in regions if r != "Select All"})),
+        tuple(sorted(set(powertrains or ()))),
+    )
+
+
+def map_years(cube):
+    """Years with data, for the map frames and slider (projections only have milestone years)."""
+    return [int(year) for year in cube.years]
+
+
+def year_span(cube):
+    """Label for the data's year range, e.g. ``'2010-2024'``; grows as deltas add years."""
+    return f'{cube.years.min()}-{cube.years.max()}'
+
+
+def select(cube, regions, powertrains):
+    if regions is not None and powertrains:
+        return cube.select(regions, powertrains)
+    return cube.select()
+
+
+def compute_kpis(cube, selection, regions, forecast=None):
+    # totals only count each vehicle once, e.g. World but not also its countries
+    totals = selection.top_level()
+    yearly_sales = totals.by_year()
+    total_sales = round(totals.total(), 2)
+    share = cube.select(regions) if regions is not None else cube.select()
+    # both region KPIs at the finest level, so World and its countries aren't counted together
+    finest = selection.finest()
+    total_regions = finest.region_count()
+    kpis = {
+        'total_sales': total_sales,
+        'avg_sales_share': round(share.avg_share(), 2),
+        'avg_yoy_growth': round(float(yearly_sales.pct_change().mean() * 100), 2),
+        'total_regions': total_regions,
+        'avg_sales_per_region': round(finest.total() / total_regions, 2) if total_regions > 0 else 0,
+        'avg_sales_per_year': round(float(yearly_sales.mean()), 2),
+    }
+    # growth of the log-linear trend over recent years; unlike the mean YoY it isn't skewed by tiny early bases.
+    # Milestone-only series (the Projection scenarios) have too few recent points for it
+    growth = trend_growth(yearly_sales)
+    if math.isfinite(growth):
+        kpis['trend_growth'] = round(growth, 2)
+    projected_share = np.nan if forecast is None else forecast.avg_share(regions)
+    if not np.isnan(projected_share):
+        kpis['projected_year'] = int(forecast.years[-1])
+        kpis['projected_share'] = round(projected_share, 2)
+    return kpis
+
+
+def add_projection(fig, history, projection, name='Projection', color=None):
+    """Continue a line chart's ``history`` series with a dashed ``projection`` (both indexed by year).
+
+    ``color`` defaults to the chart's first line, for single-series charts.
+    """
+    if projection is None or projection.empty or history.empty:
+        return fig
+    import plotly.graph_objects as go
+
+    # years the history already covers (a delta may have added them for some regions) stay solid
+    projection = projection[projection.index > history.index[-1]]
+    if projection.empty:
+        return fig
+    if color is None and fig.data:
+        color = fig.data[0].line.color
+    # start the dashed line at the last actual point so the two connect
+    x = [history.index[-1], *projection.index]
+    y = [history.iloc[-1], *projection.to_numpy()]
+    fig.add_trace(go.Scatter(
+        x=x, y=y, mode='lines', name=name, line=dict(dash='dash', color=color),
+        hovertemplate='%{x}: %{y:,.0f} (projected)<extra>' + str(name) + '</extra>'
+    ))
+    return fig
+
+
+def global_sales_figure(cube, selection, region_filtered, span, forecast=None):
+    import plotly.express as px
+
+    # Use full dataset for global view
+    source = cube.select(['World'])
+    if region_filtered:
+        filtered = selection.subset(include=['World'])
+        if not filtered.by_year().empty:
+            source = filtered
+    global_sales = source.by_year()
+    fig_global_sales = px.line(
+        global_sales.reset_index(), x='year', y='Vehicles', title=f'Global EV Sales ({span})',
+        labels={'Vehicles': 'Sales (Units)', 'year': 'Year'}
+    )
+    if forecast is not None:
+        add_projection(fig_global_sales, global_sales, forecast.by_year(source))
+    fig_global_sales.update_layout(template='plotly_dark')
+    return fig_global_sales
+
+
+def top_countries_figure(selection):
+    import plotly.express as px
+
+    top_countries = selection.countries().by_region().sort_values(ascending=False).head(5).reset_index()
+    fig_top_countries = px.bar(
+        top_countries, x='region', y='Vehicles', title='EV Sales by Country',
+        labels={'Vehicles': 'Sales (Units)', 'region': 'Country'}, text_auto=True
+    )
+    fig_top_countries.update_layout(template='plotly_dark')
+    return fig_top_countries
+
+
+def powertrain_figure(selection, span, forecast=None):
+    import plotly.express as px
+
+    # each vehicle once, like the KPIs: World but not also its continents and countries
+    selection = selection.top_level()
+    powertrain_trends = selection.by_year_powertrain()
+    fig_powertrain = px.line(
+        powertrain_trends.reset_index(), x='year', y=powertrain_trends.columns, title=f'Powertrain Trends ({span})',
+        labels={'value': 'Sales (Units)', 'year': 'Year'}
+    )
+    if forecast is not None:
+        projections = forecast.by_year_powertrain(selection)
+        colors = {trace.name: trace.line.color for trace in fig_powertrain.data}
+        for powertrain in powertrain_trends.columns.intersection(projections.columns):
+            add_projection(fig_powertrain, powertrain_trends[powertrain].dropna(), projections[powertrain],
+                           name=f'{powertrain} (projected)', color=colors.get(str(powertrain)))
+    fig_powertrain.update_layout(template='plotly_dark')
+    return fig_powertrain
+
+
+def regional_figure(selection, span):
+    import plotly.express as px
+
+    # finest non-overlapping regions, so EU27/Europe/World never add to their own members
+    regional_sales = selection.finest().by_region()
+    dim = selection.cube.dim
+    continents = dim.continent[dim.take(regional_sales.index)]
+    regional_sales = regional_sales.groupby(continents, observed=True).sum()
+    regional_sales = regional_sales.rename_axis('continent').reset_index()
+    regional_sales['continent'] = regional_sales['continent'].astype(str)
+    regional_total = regional_sales['Vehicles'].sum()
+    regional_sales = regional_sales.assign(percentage=lambda x: (x['Vehicles'] / regional_total) * 100)
+
+    # Combine small slices into "Other" if less than 2%
+    threshold = 2.0
+    others = regional_sales[regional_sales['percentage'] < threshold].copy()
+    regional_sales = regional_sales[regional_sales['percentage'] >= threshold].copy()
+    if not others.empty:
+        others_total = others['Vehicles'].sum()
+        regional_sales = pd.concat([regional_sales, pd.DataFrame({'continent': ['Other'], 'Vehicles': [others_total], 'percentage': [(others_total / regional_total) * 100]})])
+
+    fig_regional = px.pie(
+        regional_sales,
+        values='Vehicles',
+        names='continent',
+        title=f'Regional Sales Breakdown ({span})',
+        hole=0.3,
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+    fig_regional.update_traces(
+        textinfo='percent+label',
+        textposition='inside',
+        textfont=dict(size=12)
+    )
+    fig_regional.update_layout(
+        template='plotly_dark',
+        title_font_size=18,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
+    )
+    return fig_regional
+
+
+def yoy_figure(yearly_sales, projected_sales=None):
+    import plotly.express as px
+
+    yoy_growth = yearly_sales.pct_change()
+    fig_yoy = px.line(
+        yoy_growth.reset_index(), x='year', y='Vehicles', title='Year-over-Year Sales Growth (%)',
+        labels={'Vehicles': 'Growth (%)', 'year': 'Year'}
+    )
+    if projected_sales is not None and not yearly_sales.empty:
+        projected_sales = projected_sales[projected_sales.index > yearly_sales.index[-1]]
+        projected_growth = pd.concat([yearly_sales.iloc[-1:], projected_sales]).pct_change().iloc[1:]
+        add_projection(fig_yoy, yoy_growth, projected_growth)
+        fig_yoy.update_traces(hovertemplate='%{x}: %{y:.1%} (projected)<extra>Projection</extra>',
+                              selector=dict(name='Projection'))
+    fig_yoy.update_layout(template='plotly_dark')
+    return fig_yoy
+
+
+def map_figure(cube, selection, all_regions):
+    import plotly.express as px
+
+    # Create a complete set of countries and years; aggregates have no ISO-3 code and aren't drawn
+    all_years = map_years(cube)
+    iso3 = cube.dim.iso3[cube.dim.take(all_regions)]
+    countries = [region for region, code in zip(all_regions, iso3) if code is not None]
+    country_sales = (
+        selection.by_year_region()
+        .reindex(index=all_years, columns=countries, fill_value=0)
+        .rename_axis(index='year', columns='region')
+        .stack()
+        .rename('Vehicles')
+        .reset_index()
+    )
+    rows = cube.dim.take(country_sales['region'])
+    country_sales['iso3'] = cube.dim.iso3[rows]
+    country_sales['name'] = cube.dim.name[rows]
+
+    # Define custom earth-tone color scale
+    natural_colors = ['#F5F5DC', '#D9EAD3', '#A8D5BA', '#77C2A1', '#46AE88', '#158A6F']
+
+    # Create choropleth map
+    fig_map = px.choropleth(
+        country_sales,
+        locations='iso3',
+        locationmode='ISO-3',
+        color=np.log10(country_sales['Vehicles'] + 1),  # Log scale, +1 to avoid log(0)
+        animation_frame='year',
+        title=f'{MAP_TITLE} ({year_span(cube)})',
+        labels={'color': 'EV Sales'},
+        color_continuous_scale=natural_colors,
+        hover_data={
+            'name': True,
+            'year': True,
+            'Vehicles': ':,.0f'  # Format numbers with commas
+        }
+    )
+    fig_map.update_geos(
+        projection_type='robinson',
+        showcountries=True,
+        countrycolor='#4A4A4A',
+        countrywidth=0.5,
+        showocean=True,
+        oceancolor='#E6F3FF',
+        showland=True,
+        landcolor='#F5F5DC',
+        fitbounds='locations'
+    )
+    fig_map.update_layout(
+        template='plotly_dark',
+        title_font=dict(size=22, family='Times New Roman'),
+        geo=dict(
+            showframe=False,
+            showcoastlines=True,
+            coastlinecolor='#4A4A4A',
+            coastlinewidth=0.3,
+            bgcolor='white'
+        ),
+        coloraxis_colorbar=dict(
+            title='EV Sales (Log Scale)',
+            tickvals=[0, 1, 2, 3, 4, 5, 6],
+            ticktext=['0', '10', '100', '1,000', '10,000', '100,000', '1,000,000'],
+            len=0.6,
+            thickness=15
+        ),
+        updatemenus=[{
+            'type': 'buttons',
+            'direction': 'left',
+            'x': 0.1,
+            'y': 0.1,
+            'showactive': True,
+            'buttons': [
+                {
+                    'label': 'Play',
+                    'method': 'animate',
+                    'args': [None, {'frame': {'duration': 500, 'redraw': True}, 'fromcurrent': True}],
+                },
+                {
+                    'label': 'Pause',
+                    'method': 'animate',
+                    'args': [[None], {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate'}],
+                }
+            ],
+            'bgcolor': 'gray',  # Button background color
+            'bordercolor': 'black',
+            'font': {'color': 'blue', 'size': 14},  # Text color and size
+        }],
+        sliders=[{
+            'active': 0,
+            'yanchor': 'top',
+            'xanchor': 'left',
+            'currentvalue': {
+                'font': {'size': 16, 'family': 'Times New Roman'},
+                'prefix': 'Year: ',
+                'visible': True
+            },
+            'pad': {'b': 10, 't': 50}
+        }]
+    )
+    fig_map.update_traces(
+        selector=dict(type='choropleth'),
+        zmin=0,
+        zmax=6,  # Log scale up to 1,000,000
+        hovertemplate='%{customdata[0]}<br>Year: %{customdata[1]}<br>Sales: %{customdata[2]:,.0f} vehicles<extra></extra>'
+    )
+    return fig_map
+
+
+INSIGHTS_OPTIONS = {
+    'temperature': 1,
+    'top_p': 0.95,
+    'top_k': 40,
+    'max_tokens': 8192
+}
+
+
+def partition_label(partition):
+    """``'Buses, Projection-STEPS'`` style label; empty for the default historical cars data."""
+    return '' if tuple(partition) == DEFAULT_PARTITION else ', '.join(partition)
+
+
+def insights_messages(kpis, span, partition=DEFAULT_PARTITION):
+    """Prompt for the AI insights on a selection's KPIs over the ``span`` years."""
+    label = partition_label(partition)
+    data_summary = (
+        f"EV Sales Data ({f'{label}, ' if label else ''}{span}):\n"
+        f"Total Sales: {kpis['total_sales']:,} vehicles\n"
+        f"Average Sales Share: {kpis['avg_sales_share']}%\n"
+        f"Average YoY Growth: {kpis['avg_yoy_growth']}%\n"
+        + (f"Trend Growth (recent years): {kpis['trend_growth']}% per year\n" if 'trend_growth' in kpis else '')
+        + f"Total Regions: {kpis['total_regions']}\n"
+        f"Average Sales per Region: {kpis['avg_sales_per_region']:,} vehicles\n"
+        f"Average Sales per Year: {kpis['avg_sales_per_year']:,} vehicles\n"
+        + (f"Projected Sales Share {kpis['projected_year']}: {kpis['projected_share']}%\n"
+           if 'projected_share' in kpis else '')
+        + "\n"
+        f"Analyze trends in EV sales, powertrain preferences, and regional adoption. Provide actionable insights to optimize EV market strategies."
+    )
+    return [
+        {
+            'role': 'system',
+            'content': 'You are an expert in EV market analysis.'
+        },
+        {
+            'role': 'user',
+            'content': data_summary
+        }
+    ]
+
+
+def build_dashboard(cube, regions, powertrains, forecast=None):
+    """Compute KPIs and figure JSON for a canonical selection, or None if it is empty.
+
+    With a ``forecast``, the line charts get dashed projections and the
+    KPIs the projected sales share.
+    """
+    with timer('filter'):
+        selection = select(cube, regions, powertrains)
+        empty = selection.empty
+    if empty:
+        return None
+    region_filtered = regions is not None
+    # regions in order of first appearance, matching the pivoted table's order
+    all_regions = [r for r in cube.region_order() if r != 'World']
+    span = year_span(cube)
+    totals = selection.top_level()
+    builders = [
+        lambda: global_sales_figure(cube, selection, region_filtered, span, forecast),
+        lambda: top_countries_figure(selection),
+        lambda: powertrain_figure(selection, span, forecast),
+        lambda: regional_figure(selection, span),
+        lambda: yoy_figure(totals.by_year(), None if forecast is None else forecast.by_year(totals)),
+        lambda: map_figure(cube, selection, all_regions),
+    ]
+    figures = {}
+    for title, build_figure in zip(FIGURE_TITLES, builders):
+        with timer('figure', figure=title):
+            figures[title] = compact_json(build_figure())
+    with timer('kpis'):
+        kpis = compute_kpis(cube, selection, regions, forecast)
+    return {'kpis': kpis, 'figures': figures}
+
+
+def map_frame_json(map_json, year):
+    """Cut a static single-year figure out of the animated map's JSON."""
+    spec = json.loads(map_json)
+    frame = next((f for f in spec.get('frames', []) if f['name'] == str(year)), None)
+    if frame is None:
+        raise ValueError(f'the map has no frame for {year}')
+    base = spec['data'][0]
+    # frames only carry per-year data; keep the colour range and hover text of the base trace
+    trace = {**frame['data'][0], **{k: base[k] for k in ('zmin', 'zmax', 'hovertemplate') if k in base}}
+    layout = {k: v for k, v in spec['layout'].items() if k not in ('sliders', 'updatemenus')}
+    layout['title'] = {**layout.get('title', {}), 'text': f'{MAP_TITLE} ({year})'}
+    return dumps({'data': [trace], 'layout': layout})
+
+
+def get_dashboard_json(data, regions, powertrains, map_year=None, projections=True):
+    """Return ``(kpis, figures_json)`` for a sidebar selection, or None if it matches no rows.
+
+    ``figures_json`` maps each title in FIGURE_TITLES to its cached figure
+    JSON. With ``map_year`` set, the animated map is replaced by that year's
+    frame alone, which keeps the other years' frames off the wire.
+    ``projections`` adds the forecast (historical data only).
+    """
+    forecast = get_forecast(data) if projections else None
+    canonical = canonical_key(regions, powertrains)
+    key = (data.signature, data.partition, forecast is not None, *canonical)
+    with timer('dashboard'):
+        result = dashboard_cache.get_or_compute(key, lambda: build_dashboard(data.cube, *canonical, forecast))
+    if result is None:
+        return None
+    figures = dict(result['figures'])
+    if map_year is not None:
+        figures[MAP_TITLE] = map_frame_cache.get_or_compute(
+            (*key, map_year), lambda: map_frame_json(result['figures'][MAP_TITLE], map_year)
+        )
+    return result['kpis'], figures
+
+
+def get_dashboard(data, regions, powertrains, map_year=None, projections=True):
+    """Like get_dashboard_json, but with the figures decoded into plotly Figures.
+
+    The Figures are fresh objects, so callers may mutate them without
+    touching the cached JSON.
+    """
+    import plotly.io as pio
+
+    result = get_dashboard_json(data, regions, powertrains, map_year, projections)
+    if result is None:
+        return None
+    kpis, figures = result
+    return kpis, {title: pio.from_json(fig) for title, fig in figures.items()}
@@ -0,0 +1,412 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # columnar cache is optional; fall back to the CSV
+    pa = None
+    feather = None
+
+from core.cube import SalesCube, build_cube
+from core.metrics import frame_bytes, set_gauge, timer
+
+# Shared EV sales data layer. Every page reads from here instead of parsing
+# the CSV itself; the parsed and pivoted frames live once per process and are
+# rebuilt only when the source file changes on disk. Data is loaded one
+# (mode, category) partition at a time, e.g. ('Cars', 'Historical'), from
+# per-partition columnar files, so looking at cars never loads buses or
+# projections. New years or regions can
+# be dropped into data/deltas/ as extra CSVs with the same schema; they are
+# merged into the loaded data incrementally, recomputing only the
+# (year, region) partitions they touch.
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATA_PATH = ROOT_DIR / 'data' / 'global_ev_sales_2010_2024.csv'
+CACHE_DIR = ROOT_DIR / 'data' / '.cache'
+COLUMNS = ['region', 'category', 'parameter', 'mode', 'powertrain', 'year', 'unit', 'value']
+DIMENSIONS = ['region', 'category', 'parameter', 'mode', 'powertrain', 'unit']
+DTYPES = {**{col: 'category' for col in DIMENSIONS}, 'year': 'int16', 'value': 'float64'}
+KEY_COLUMNS = [col for col in COLUMNS if col != 'value']
+PARTITION_COLUMNS = ['mode', 'category']
+DEFAULT_PARTITION = ('Cars', 'Historical')
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class EVData:
+    """One (mode, category) partition of the dataset plus the pivots every page needs.
+
+    The frames are shared between all sessions, so callers must treat them
+    as read-only and copy (or ``assign``) before adding columns.
+    ``signature`` is ``(base file signature, applied delta signatures)``;
+    ``df`` holds the partition's raw rows.
+    """
+    signature: tuple
+    partition: tuple
+    df: pd.DataFrame
+    sales_df: pd.DataFrame
+    sales_share_df: pd.DataFrame
+    cube: SalesCube
+
+
+_cache = {}
+_partition_lists = {}
+_lock = threading.Lock()
+
+
+def file_signature(path):
+    # mtime + size is enough to notice a replaced or edited CSV without
+    # hashing the whole file on every rerun
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_csv(path):
+    return pd.read_csv(path, dtype=DTYPES)
+
+
+def cache_dir(path):
+    return CACHE_DIR / Path(path).stem
+
+
+def cache_path(path, partition):
+    name = '__'.join(re.sub(r'[^A-Za-z0-9]+', '-', part) for part in partition)
+    return cache_dir(path) / f'{name}.feather'
+
+
+def manifest_path(path):
+    return cache_dir(path) / 'partitions.json'
+
+
+def _signature_tag(signature):
+    return f'{signature[0]}:{signature[1]}'.encode()
+
+
+def read_cache(path, partition, signature):
+    """Memory-map the columnar cache of one partition if it matches ``signature``."""
+    target = cache_path(path, partition)
+    if feather is None or not target.exists():
+        return None
+    try:
+        with pa.memory_map(str(target)) as source:
+            schema = pa.ipc.open_file(source).schema
+        if (schema.metadata or {}).get(b'source_signature') != _signature_tag(signature):
+            return None
+        return feather.read_table(str(target), memory_map=True).to_pandas()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+
+def read_manifest(path, signature):
+    """Return the cached partitions' ``(mode, category, has_sales)`` list, or None if stale."""
+    try:
+        manifest = json.loads(manifest_path(path).read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get('signature') != list(signature):
+        return None
+    return [tuple(entry) for entry in manifest['partitions']]
+
+
+def _replace_file(target, write):
+    # write to a temp file first so concurrent readers never see a partial cache
+    tmp = target.with_suffix(f'.{os.getpid()}.tmp')
+    write(tmp)
+    os.replace(tmp, target)
+
+
+def write_cache(df, path, signature):
+    """Split ``df`` into one typed Arrow/Feather file per partition, tagged with the source signature."""
+    if feather is None:
+        return None
+    folder = cache_dir(path)
+    folder.mkdir(parents=True, exist_ok=True)
+    entries = []
+    written = set()
+    for partition, part in df.groupby(PARTITION_COLUMNS, observed=True):
+        table = pa.Table.from_pandas(part.reset_index(drop=True), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'source_signature': _signature_tag(signature),
+        })
+        target = cache_path(path, partition)
+        _replace_file(target, lambda tmp: feather.write_feather(table, str(tmp), compression='uncompressed'))
+        written.add(target)
+        entries.append([*map(str, partition), bool((part['parameter'] == 'EV sales').any())])
+    for stale in folder.glob('*.feather'):
+        if stale not in written:
+            stale.unlink(missing_ok=True)
+    # written last: a fresh manifest means every partition file is in place
+    manifest = json.dumps({'signature': list(signature), 'partitions': entries})
+    _replace_file(manifest_path(path), lambda tmp: tmp.write_text(manifest))
+    return folder
+
+
+def _partition(df, partition):
+    mode, category = partition
+    return df[(df['mode'] == mode) & (df['category'] == category)].reset_index(drop=True)
+
+
+def _parse(path, signature):
+    df = read_csv(path)
+    try:
+        write_cache(df, path, signature)
+    except OSError:
+        pass  # read-only checkout; keep serving from the CSV
+    return df
+
+
+def load_partition(path, partition=DEFAULT_PARTITION, signature=None):
+    """Load one partition's raw rows, preferring a fresh columnar cache over the CSV."""
+    signature = signature or file_signature(path)
+    df = read_cache(path, partition, signature)
+    if df is not None:
+        return df
+    if feather is not None and read_manifest(path, signature) is not None:
+        # the cache is fresh, so a missing file means the partition has no rows
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in DTYPES.items()})[COLUMNS]
+    return _partition(_parse(path, signature), partition)
+
+
+def list_partitions(path=DATA_PATH):
+    """``(mode, category)`` pairs that have EV sales rows, including ones added by deltas.
+
+    Answered from the cache manifest, so listing the partitions does not
+    load any of them.
+    """
+    path = str(path)
+    base_signature = file_signature(path)
+    signature = (base_signature, delta_signatures(path))
+    cached = _partition_lists.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    entries = read_manifest(path, base_signature)
+    if entries is None and feather is not None:
+        _parse(path, base_signature)
+        entries = read_manifest(path, base_signature)
+    if entries is None:
+        # no pyarrow (or read-only cache dir): scan just the columns we need
+        df = pd.read_csv(path, usecols=[*PARTITION_COLUMNS, 'parameter'])
+        entries = [(*key, True) for key in df[df['parameter'] == 'EV sales'].groupby(PARTITION_COLUMNS).groups]
+    found = {(mode, category) for mode, category, has_sales in entries if has_sales}
+    for name, *_ in signature[1]:
+        try:
+            delta = read_delta(delta_dir(path) / name)
+        except (OSError, ValueError):
+            continue
+        sales = delta[delta['parameter'] == 'EV sales']
+        found |= set(map(tuple, sales[PARTITION_COLUMNS].astype(str).drop_duplicates().to_numpy().tolist()))
+    found = sorted(found)
+    _partition_lists[path] = (signature, found)
+    return found
+
+
+def convert(path=DATA_PATH):
+    """Rebuild the per-partition columnar cache for ``path`` and return its location."""
+    return write_cache(read_csv(path), path, file_signature(path))
+
+
+def _pivot(df, index, unit):
+    pivot = df.pivot_table(
+        values='value', index=index, columns='unit', aggfunc='sum', observed=True
+    ).reset_index()
+    pivot.columns = [str(col) for col in pivot.columns]
+    if unit not in pivot:
+        pivot[unit] = pd.Series(dtype='float64')
+    # the pivots are small; plain strings keep the pages' groupby/map semantics
+    for col in index:
+        if isinstance(pivot[col].dtype, pd.CategoricalDtype):
+            pivot[col] = pivot[col].astype(str)
+    return pivot
+
+
+def _pivots(df):
+    sales_df = _pivot(df[df['parameter'] == 'EV sales'], ['year', 'region', 'powertrain'], 'Vehicles')
+    sales_share_df = _pivot(df[df['parameter'] == 'EV sales share'], ['year', 'region'], 'percent')
+    return sales_df, sales_share_df
+
+
+def build(df, signature=None, partition=DEFAULT_PARTITION):
+    """Pivot the raw rows of one partition."""
+    sales_df, sales_share_df = _pivots(df)
+    cube = build_cube(sales_df, sales_share_df)
+    return EVData(signature, partition, df, sales_df, sales_share_df, cube)
+
+
+def delta_dir(path):
+    return Path(path).parent / 'deltas'
+
+
+def delta_signatures(path):
+    """``(name, mtime_ns, size)`` for every delta CSV of ``path``, in apply order."""
+    folder = delta_dir(path)
+    if not folder.is_dir():
+        return ()
+    return tuple((p.name, *file_signature(p)) for p in sorted(folder.glob('*.csv')))
+
+
+def validate(df, source='delta'):
+    """Check ``df`` against the dataset schema and return it with the dataset dtypes."""
+    missing = [col for col in COLUMNS if col not in df.columns]
+    extra = [col for col in df.columns if col not in COLUMNS]
+    if missing or extra:
+        raise SchemaError(f'{source}: expected columns {COLUMNS}, missing {missing}, unexpected {extra}')
+    if df[DIMENSIONS].isna().any().any():
+        raise SchemaError(f'{source}: empty values in {DIMENSIONS}')
+    year = pd.to_numeric(df['year'], errors='coerce')
+    if year.isna().any() or (year % 1 != 0).any() or not year.between(1900, 2100).all():
+        raise SchemaError(f'{source}: year must be a whole number between 1900 and 2100')
+    value = pd.to_numeric(df['value'], errors='coerce')
+    if value.isna().any():
+        raise SchemaError(f'{source}: value must be numeric')
+    if df.duplicated(KEY_COLUMNS).any():
+        raise SchemaError(f'{source}: duplicate rows for the same {KEY_COLUMNS}')
+    return df[COLUMNS].assign(year=year, value=value).astype(DTYPES)
+
+
+def read_delta(path):
+    return validate(pd.read_csv(path), source=Path(path).name)
+
+
+def _concat(frames):
+    # categoricals only survive concat when their categories match
+    for col in DIMENSIONS:
+        categories = pd.api.types.union_categoricals([f[col] for f in frames]).categories
+        frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _in_partitions(df, partitions):
+    return pd.MultiIndex.from_frame(df[['year', 'region']].astype({'region': str})).isin(partitions)
+
+
+def apply_delta(data, delta, delta_signature):
+    """Merge a validated delta frame (rows of ``data``'s partition) into ``data``.
+
+    Rows in the delta replace rows with the same key. Only the (year,
+    region) partitions present in the delta are re-filtered and re-pivoted;
+    the rest of the pivots and the cube are carried over as-is.
+    """
+    partitions = pd.MultiIndex.from_frame(delta[['year', 'region']].astype({'region': str}).drop_duplicates())
+    touched = _in_partitions(data.df, partitions)
+    merged = _concat([data.df[touched], delta]).drop_duplicates(KEY_COLUMNS, keep='last')
+    df = _concat([data.df[~touched], merged])
+
+    sales_part, share_part = _pivots(merged)
+    sales_df = pd.concat(
+        [data.sales_df[~_in_partitions(data.sales_df, partitions)], sales_part], ignore_index=True
+    ).sort_values(['year', 'region', 'powertrain'], ignore_index=True)
+    sales_share_df = pd.concat(
+        [data.sales_share_df[~_in_partitions(data.sales_share_df, partitions)], share_part], ignore_index=True
+    ).sort_values(['year', 'region'], ignore_index=True)
+
+    cube = data.cube.merge(sales_part, share_part, partitions)
+    base_signature, deltas = data.signature
+    return EVData((base_signature, deltas + (delta_signature,)), data.partition, df, sales_df, sales_share_df, cube)
+
+
+def _apply_deltas(data, path, signatures):
+    for signature in signatures:
+        try:
+            delta = _partition(read_delta(delta_dir(path) / signature[0]), data.partition)
+        except (OSError, ValueError) as e:
+            # a bad delta must not take the dashboard down; skip it until fixed
+            logger.error('skipping delta %s: %s', signature[0], e)
+            delta = None
+        if delta is None or delta.empty:
+            base_signature, deltas = data.signature
+            data = replace(data, signature=(base_signature, deltas + (signature,)))
+            continue
+        data = apply_delta(data, delta, signature)
+    return data
+
+
+def get_data(path=DATA_PATH, partition=DEFAULT_PARTITION):
+    """Return the shared EVData for one partition of ``path``, reloading if the file or its deltas changed.
+
+    Each partition is loaded and cached on its own the first time it is
+    asked for. New delta files are merged into the already-loaded data; a
+    changed base file or a changed/removed delta triggers a full reload.
+    """
+    path = str(path)
+    partition = tuple(partition)
+    base_signature = file_signature(path)
+    deltas = delta_signatures(path)
+    signature = (base_signature, deltas)
+    cached = _cache.get((path, partition))
+    if cached is not None and cached.signature == signature:
+        return cached
+    with _lock:
+        cached = _cache.get((path, partition))
+        if cached is None or cached.signature != signature:
+            applied = () if cached is None else cached.signature[1]
+            label = '/'.join(partition)
+            if cached is None or cached.signature[0] != base_signature or deltas[:len(applied)] != applied:
+                with timer('load', partition=label):
+                    df = load_partition(path, partition, base_signature)
+                with timer('pivot', partition=label):
+                    cached = build(df, (base_signature, ()), partition)
+                applied = ()
+            if deltas[len(applied):]:
+                with timer('apply_deltas', partition=label):
+                    cached = _apply_deltas(cached, path, deltas[len(applied):])
+            _cache[(path, partition)] = cached
+            set_gauge('dataframe_bytes', frame_bytes(cached.df, cached.sales_df, cached.sales_share_df),
+                      partition=label)
+            set_gauge('cube_bytes', frame_bytes(cached.cube.sales, cached.cube.present, cached.cube.share),
+                      partition=label)
+    return cached
+
+
+def next_delta_number(path):
+    """The sequence number for the next delta of ``path``: one past the highest in use."""
+    numbers = [int(match.group(1)) for name, *_ in delta_signatures(path) if (match := re.match(r'(\d+)_', name))]
+    return max(numbers, default=0) + 1
+
+
+def ingest(delta_path, path=DATA_PATH):
+    """Validate ``delta_path`` and add it to the deltas of ``path``.
+
+    Running processes pick the delta up on their next rerun.
+    """
+    delta_path = Path(delta_path)
+    rows = len(read_delta(delta_path))
+    folder = delta_dir(path)
+    folder.mkdir(parents=True, exist_ok=True)
+    # numbered after the highest existing prefix so deltas apply in ingestion order, even after one is removed
+    target = folder / f'{next_delta_number(path):04d}_{delta_path.name}'
+    tmp = target.with_suffix('.tmp')
+    shutil.copyfile(delta_path, tmp)
+    os.replace(tmp, target)
+    return target, rows
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _partition_lists.clear()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:2] == ['ingest']:
+        for arg in sys.argv[2:]:
+            target, rows = ingest(arg)
+            print(f'ingested {rows} rows as {target}')
+    else:
+        for arg in sys.argv[1:] or [DATA_PATH]:
+            print(convert(arg) or 'pyarrow is not installed; nothing written')
@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from core.memo import get_cache
+from core.metrics import timer
+
+# Growth models fitted to every series of a partition at once:
+#   sales  log-linear trend per (region, powertrain): log(sales) = a + b * year
+#   share  logistic S-curve per region on the EV sales share, fitted as a
+#          line in logit space: log(s / (100 - s)) = r * (year - t0)
+# Each fit is a weighted least-squares line over the last FIT_YEARS observed
+# years, solved in closed form for all series together with array sums, so
+# there is no per-series Python loop. Projections continue from each series'
+# own last observed year and value, so the dashed lines start where the solid
+# ones end even when a delta has added a newer year for only some regions,
+# and a region's sales projection is capped by what its share curve allows.
+# Fitted forecasts are cached per data version.
+
+FIT_YEARS = 6        # recent years each trend is fitted on; early tiny bases skew the growth
+MIN_POINTS = 3       # fewer observations than this and a series gets no projection
+HORIZON = 5          # years projected past the newest year with data
+MAX_STALE_YEARS = 1  # series whose last observation is this far behind the newest year are still projected
+MAX_GROWTH = 1.0     # cap on the fitted annual sales growth (+100%), so short steep series don't explode
+SHARE_BOUNDS = (0.01, 99.99)
+
+forecast_cache = get_cache('forecasts', max_entries=32, max_bytes=64 * 1024 * 1024)
+
+
+def fit_lines(t, y, w):
+    """Weighted least-squares slope of ``y`` on ``t`` for every column at once.
+
+    ``t`` is (T,), ``y`` and ``w`` are (T, N); ``w`` is 0 where a column has
+    no observation. Columns with fewer than MIN_POINTS observations get NaN.
+    """
+    w = w.astype(float)
+    y = np.where(w > 0, y, 0.0)
+    t = t[:, None].astype(float)
+    sw = w.sum(axis=0)
+    st = (w * t).sum(axis=0)
+    sy = (w * y).sum(axis=0)
+    stt = (w * t * t).sum(axis=0)
+    sty = (w * t * y).sum(axis=0)
+    den = sw * stt - st * st
+    ok = (sw >= MIN_POINTS) & (den > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(ok, (sw * sty - st * sy) / den, np.nan)
+
+
+def _recent(t, observed):
+    """Restrict ``observed`` (T, N) to each column's last FIT_YEARS years; also return each column's last index."""
+    last = len(t) - 1 - np.argmax(observed[::-1], axis=0)
+    window = t[:, None] > t[last][None, :] - FIT_YEARS
+    return observed & window, last
+
+
+def trend_growth(yearly_sales):
+    """Annual growth (in %) of the log-linear trend through a yearly series' recent years, or NaN."""
+    values = yearly_sales.to_numpy(dtype=float)[:, None]
+    t = yearly_sales.index.to_numpy()
+    observed, _ = _recent(t, values > 0)
+    with np.errstate(divide='ignore'):
+        slope = fit_lines(t, np.log(values), observed)[0]
+    return float(np.expm1(slope) * 100)
+
+
+@dataclass(frozen=True)
+class Forecast:
+    """Projections for the ``years`` after the data, aligned to the cube's axes."""
+    years: pd.Index
+    regions: pd.Index
+    powertrains: pd.Index
+    sales: np.ndarray      # (year, region, powertrain) projected vehicles, 0 where a series has no model
+    modeled: np.ndarray    # (region, powertrain) True where the sales series has a projection
+    growth: np.ndarray     # (region, powertrain) fitted annual sales growth rate, NaN without a model
+    share: np.ndarray      # (year, region) projected EV sales share in percent, NaN without a model
+
+    def _masks(self, selection):
+        return self.regions.isin(selection.regions), self.powertrains.isin(selection.powertrains)
+
+    def by_year(self, selection):
+        """Projected sales per year summed over the selection, like ``selection.by_year()``."""
+        regions, powertrains = self._masks(selection)
+        values = self.sales[:, regions][:, :, powertrains].sum(axis=(1, 2))
+        return pd.Series(values, index=self.years, name='Vehicles')
+
+    def by_year_powertrain(self, selection):
+        """Projected year x powertrain sales for the powertrains with a projection in the selection."""
+        regions, powertrains = self._masks(selection)
+        cols = powertrains & (self.modeled[regions].any(axis=0))
+        values = self.sales[:, regions][:, :, cols].sum(axis=1)
+        return pd.DataFrame(values, index=self.years, columns=self.powertrains[cols])
+
+    def avg_share(self, regions=None):
+        """Mean projected sales share in the last projected year over ``regions`` (None = all)."""
+        mask = np.ones(len(self.regions), dtype=bool) if regions is None else self.regions.isin(list(regions))
+        share = self.share[-1, mask]
+        if np.isnan(share).all():
+            return np.nan
+        return float(np.nanmean(share))
+
+
+def fit(cube, horizon=HORIZON):
+    """Fit the sales and share models to every series of ``cube``."""
+    sales, present, share = cube.dense()
+    t = cube.years.to_numpy()
+    T, R, P = sales.shape
+    current = t[-1] - MAX_STALE_YEARS
+
+    # sales: one column per (region, powertrain); series that stopped reporting years ago aren't projected
+    values = sales.reshape(T, R * P)
+    observed = present.reshape(T, R * P) & (values > 0)
+    observed, last = _recent(t, observed)
+    with np.errstate(divide='ignore'):
+        slope = fit_lines(t, np.log(values), observed)
+    modeled = ~np.isnan(slope) & (t[last] >= current)
+
+    # share: logistic curve per region, capped at 100%
+    observed = ~np.isnan(share)
+    observed, last_share = _recent(t, observed)
+    bounded = np.clip(np.nan_to_num(share), *SHARE_BOUNDS)
+    logit = np.log(bounded / (100 - bounded))
+    rate = fit_lines(t, logit, observed)
+    share_ok = ~np.isnan(rate) & (t[last_share] >= current)
+
+    # projected years run from the year after the oldest projected series' last one to HORIZON past the newest
+    ends = np.concatenate([t[last][modeled], t[last_share][share_ok]])
+    future = np.arange((ends.min() if len(ends) else t[-1]) + 1, t[-1] + 1 + horizon)
+    ahead = future[:, None] > t[last]  # only years after a series' own last observation
+
+    slope = np.minimum(slope, np.log1p(MAX_GROWTH))
+    start = values[last, np.arange(R * P)]
+    projected = start * np.exp(slope * (future[:, None] - t[last]))
+    projected = np.where(modeled & ahead, projected, 0.0)
+
+    start = logit[last_share, np.arange(R)]
+    projected_share = 100 / (1 + np.exp(-(start + rate * (future[:, None] - t[last_share]))))
+    projected_share = np.where(share_ok & (future[:, None] > t[last_share]), projected_share, np.nan)
+
+    # EV sales can't outgrow the market: where a region has a share curve, cap its projected sales at
+    # the total market in its last year with a share (EV sales / share) times the projected share
+    projected = projected.reshape(len(future), R, P)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        regions = np.arange(R)
+        market = sales[last_share, regions].sum(axis=1) / (share[last_share, regions] / 100)
+        cap = market * projected_share / 100
+        total = projected.sum(axis=2)
+        scale = np.where(np.isfinite(cap) & (total > cap), cap / total, 1.0)
+    projected = projected * scale[:, :, None]
+
+    return Forecast(
+        years=pd.Index(future, name='year'),
+        regions=cube.regions,
+        powertrains=cube.powertrains,
+        sales=projected,
+        modeled=modeled.reshape(R, P),
+        growth=np.where(modeled, np.expm1(slope), np.nan).reshape(R, P),
+        share=projected_share,
+    )
+
+
+def forecastable(partition):
+    """Only historical data is extrapolated; the projection scenarios already are forecasts."""
+    return partition[1] == 'Historical'
+
+
+def get_forecast(data):
+    """Return the cached Forecast for a query source (EVData or QuerySource), or None if it has none."""
+    if not forecastable(data.partition):
+        return None
+
+    def compute():
+        with timer('forecast_fit', partition='/'.join(data.partition)):
+            return fit(data.cube)
+
+    return forecast_cache.get_or_compute((data.signature, data.partition), compute)
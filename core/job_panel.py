@@ -0,0 +1,64 @@
+import streamlit as st
+
+from core import jobs
+
+# Shows a background job from core.jobs on a page. The job id lives in
+# st.session_state; while the job runs, a fragment re-polls it every
+# POLL_INTERVAL seconds so only that part of the page reruns, and once it
+# finishes the whole page reruns once to pick up the result.
+
+POLL_INTERVAL = 1.0
+
+
+def start_job(key, kind, func, *args, label=None, **kwargs):
+    """Submit a job for this session and remember it under st.session_state[key].
+
+    While the previous job under ``key`` is still running, that job is
+    returned instead of starting a duplicate.
+    """
+    job = current_job(key)
+    if job is not None and job.pending:
+        return job
+    job = jobs.submit(jobs.session_id(), kind, func, *args, label=label, **kwargs)
+    st.session_state[key] = job.id
+    return job
+
+
+def current_job(key):
+    return jobs.get(jobs.session_id(), st.session_state.get(key))
+
+
+def is_running(key):
+    job = current_job(key)
+    return job is not None and job.pending
+
+
+def show_job(key, render):
+    """Poll the job under st.session_state[key]; ``render(job)`` draws its partial or final output."""
+    polling = is_running(key)
+    st.session_state[f'{key}_polling'] = polling
+
+    @st.fragment(run_every=POLL_INTERVAL if polling else None)
+    def panel():
+        job = current_job(key)
+        if job is None:
+            return
+        if job.pending:
+            text = job.message or f'{job.label}...'
+            if job.progress is not None:
+                st.progress(job.progress, text=text)
+            else:
+                st.caption(f'{text} ({job.elapsed:.0f}s)')
+            if st.button('Cancel', key=f'{key}_cancel'):
+                job.cancel()
+        elif job.status == jobs.FAILED:
+            st.error(f'{job.label} failed: {job.error}')
+        elif job.status == jobs.CANCELLED:
+            st.info(f'{job.label} cancelled.')
+        render(job)
+        if not job.pending and st.session_state.get(f'{key}_polling'):
+            # rerun the page once so widgets outside the fragment see the result
+            st.session_state[f'{key}_polling'] = False
+            st.rerun()
+
+    panel()
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from core.metrics import observe, timer
+
+# Background jobs for long-running work started from a page (AI insights,
+# batch promotions, PDF reports). submit() returns at once; the work runs on
+# a process-wide thread pool, so the session's script thread is free to
+# finish the rerun. Jobs are kept in a registry keyed by Streamlit session,
+# where later reruns poll their status and pick up the result. Job functions
+# get the Job as their first argument to report progress and partial output
+# and to notice cancellation.
+
+JOB_WORKERS = int(os.getenv('EV_DASHBOARD_JOB_WORKERS', '8'))
+MAX_JOBS_PER_SESSION = 20
+JOB_TTL = 3600  # seconds a finished job stays retrievable
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+PENDING = (QUEUED, RUNNING)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    id: str
+    session: str
+    kind: str
+    label: str
+    submitted: float
+    status: str = QUEUED
+    started: float = None
+    finished: float = None
+    progress: float = None   # 0..1, when the job reports it
+    message: str = ''
+    partial: object = None   # output so far, e.g. the text streamed until now
+    result: object = None
+    error: Exception = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: object = field(default=None, repr=False)
+
+    @property
+    def pending(self):
+        return self.status in PENDING
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - (self.started or self.submitted)
+
+    def report(self, progress=None, message=None, partial=None):
+        """Called from the job function to publish progress and partial output."""
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+    def cancel(self):
+        """Ask the job to stop; a job still in the queue never starts."""
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+
+    def _finish(self, status):
+        self.finished = time.time()
+        self.status = status
+
+
+_sessions = {}  # session id -> {job id: Job}, oldest first
+_lock = threading.Lock()
+_pool = None
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # threads: the jobs wait on Ollama or on the report's own render processes
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        return _pool
+
+
+def _run(job, func, args, kwargs):
+    if job.cancelled:
+        job._finish(CANCELLED)
+        return
+    job.started = time.time()
+    job.status = RUNNING
+    observe('job_queue', job.started - job.submitted, kind=job.kind)
+    try:
+        with timer('job', kind=job.kind):
+            job.result = func(job, *args, **kwargs)
+    except Exception as e:
+        logger.exception('%s job %s failed', job.kind, job.id)
+        job.error = e
+        job._finish(FAILED)
+    else:
+        job._finish(CANCELLED if job.cancelled else DONE)
+
+
+def _prune(now):
+    for session, jobs in list(_sessions.items()):
+        for job_id, job in list(jobs.items()):
+            if not job.pending and now - job.finished > JOB_TTL:
+                del jobs[job_id]
+        finished = [job_id for job_id, job in jobs.items() if not job.pending]
+        for job_id in finished[:max(0, len(jobs) - MAX_JOBS_PER_SESSION)]:
+            del jobs[job_id]
+        if not jobs:
+            del _sessions[session]
+
+
+def submit(session, kind, func, *args, label=None, **kwargs):
+    """Run ``func(job, *args, **kwargs)`` in the background for ``session``; returns the Job at once."""
+    job = Job(uuid.uuid4().hex[:12], session, kind, label or kind, time.time())
+    pool = get_pool()
+    with _lock:
+        _prune(job.submitted)
+        _sessions.setdefault(session, {})[job.id] = job
+    job._future = pool.submit(_run, job, func, args, kwargs)
+    return job
+
+
+def get(session, job_id):
+    """The session's job with ``job_id``, or None if it is unknown or expired."""
+    if job_id is None:
+        return None
+    with _lock:
+        return _sessions.get(session, {}).get(job_id)
+
+
+def jobs(session, kind=None):
+    """The session's jobs, newest first, optionally only those of ``kind``."""
+    with _lock:
+        items = list(_sessions.get(session, {}).values())
+    return [job for job in reversed(items) if kind is None or job.kind == kind]
+
+
+def pending_count():
+    with _lock:
+        return sum(job.pending for jobs in _sessions.values() for job in jobs.values())
+
+
+def session_id():
+    """The current Streamlit session's id ('default' outside a script run)."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'default'
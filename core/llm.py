@@ -0,0 +1,280 @@
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core.llm_cache import get_response_cache, request_key, reusable
+from core.metrics import observe
+
+# Streaming wrapper around ollama.chat. Pages hand a ChatStream to
+# st.write_stream so tokens render as they arrive, and every call records
+# its time-to-first-token and decode speed. Responses go through the
+# persistent cache in core.llm_cache. ollama (and httpx under it) is imported
+# when the first client is created, so pages that never call the model, and
+# the app's own startup, don't pay for it.
+
+logger = logging.getLogger(__name__)
+
+# Shared Ollama settings, overridable through the environment
+MODEL = os.getenv('EV_DASHBOARD_MODEL', 'llama3.1:8b')
+HOST = os.getenv('OLLAMA_HOST')  # None -> ollama's default (localhost:11434)
+KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+WARM_UP = os.getenv('OLLAMA_WARM_UP', '1') not in ('0', 'false', 'no')
+MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '16'))
+RETRIES = int(os.getenv('OLLAMA_RETRIES', '3'))
+RETRY_BACKOFF = 0.5  # seconds, doubled after each attempt
+MAX_CLIENTS = 4  # pooled clients kept, one per timeout, most recently used first
+
+# Errors worth retrying: the server is unreachable, restarting or still
+# loading the model (httpx exception names)
+TRANSIENT_ERRORS = ('ConnectError', 'RemoteProtocolError', 'ReadError', 'PoolTimeout')
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def get_client(timeout=None):
+    """Return the process-wide pooled Ollama client for ``timeout``.
+
+    ollama.Client takes its timeout once, so each timeout gets its own
+    client; only the MAX_CLIENTS most recently used are kept.
+    """
+    import httpx
+    import ollama
+
+    with _clients_lock:
+        client = _clients.get(timeout)
+        if client is None:
+            client = _clients[timeout] = ollama.Client(
+                host=HOST,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+        _clients.move_to_end(timeout)
+        while len(_clients) > MAX_CLIENTS:
+            _, evicted = _clients.popitem(last=False)
+            # a batch may still be using it; its connection pool closes once nothing holds the client
+            weakref.finalize(evicted, evicted._client.close)
+        return client
+
+
+def is_transient(error):
+    import httpx
+    import ollama
+
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code in TRANSIENT_STATUS
+    return isinstance(error, tuple(getattr(httpx, name) for name in TRANSIENT_ERRORS))
+
+
+def with_retries(call, retries=None):
+    """Run ``call()``, retrying transient Ollama errors with exponential backoff."""
+    retries = RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = RETRY_BACKOFF * 2 ** attempt
+            logger.warning('ollama request failed (%s); retrying in %.1fs', e, delay)
+            time.sleep(delay)
+
+
+_warmed_up = threading.Event()
+
+
+def warm_up(model=None, block=False):
+    """Load ``model`` into the Ollama server once per process so the first real request doesn't stall."""
+    if not WARM_UP or _warmed_up.is_set():
+        return
+    _warmed_up.set()
+
+    def ping():
+        try:
+            # an empty prompt only loads the model and applies keep_alive
+            with_retries(lambda: get_client().generate(model=model or MODEL, prompt='', keep_alive=KEEP_ALIVE))
+        except Exception as e:
+            logger.warning('ollama warm-up failed: %s', e)
+
+    if block:
+        ping()
+    else:
+        threading.Thread(target=ping, name='ollama-warm-up', daemon=True).start()
+
+# Most recent call stats, newest last
+history = deque(maxlen=500)
+_history_lock = threading.Lock()
+
+
+class ChatStream:
+    """Iterable over the content chunks of one streamed ``ollama.chat`` call.
+
+    After iteration finishes, ``text`` holds the full response and
+    ``stats()`` returns the timings for the call.
+
+    ``reuse`` controls whether a cached response may answer the call; by
+    default only calls below temperature 1 reuse. ``refresh`` skips the
+    cache lookup ("regenerate") but still stores the new response.
+    ``use_cache=False`` bypasses the cache entirely, e.g. for stub clients.
+    """
+
+    def __init__(self, model, messages, options=None, client=None, timeout=None, reuse=None, refresh=False,
+                 use_cache=True):
+        self.model = model
+        self.messages = messages
+        self.options = options
+        self.client = client or get_client()
+        self.timeout = timeout
+        self.reuse = reusable(options) if reuse is None else reuse
+        self.refresh = refresh
+        self.use_cache = use_cache
+        self.cached = False
+        self.text = ''
+        self.started = None
+        self.first_token = None
+        self.finished = None
+        self.tokens = 0
+        self.prompt_tokens = None
+        self.eval_duration = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        cache = get_response_cache() if self.use_cache else None
+        key = request_key(self.model, self.messages, self.options) if cache else None
+        if cache and self.reuse and not self.refresh:
+            text = cache.get(key)
+            if text is not None:
+                self.cached = True
+                self.first_token = self.finished = time.perf_counter()
+                self.text = text
+                self._record()
+                yield text
+                return
+        chunks = []
+        completed = False
+        try:
+            for chunk in self._open():
+                if self.timeout is not None and time.perf_counter() - self.started > self.timeout:
+                    raise TimeoutError(f'{self.model} did not finish within {self.timeout}s')
+                content = chunk.get('message', {}).get('content', '')
+                if content:
+                    if self.first_token is None:
+                        self.first_token = time.perf_counter()
+                    self.tokens += 1
+                    chunks.append(content)
+                    yield content
+                if chunk.get('done'):
+                    # the final chunk carries the server's own token counts
+                    self.tokens = chunk.get('eval_count', self.tokens)
+                    self.prompt_tokens = chunk.get('prompt_eval_count')
+                    self.eval_duration = chunk.get('eval_duration')
+            completed = True
+        finally:
+            self.finished = time.perf_counter()
+            self.text = ''.join(chunks)
+            self._record()
+        if cache and completed and self.text:
+            cache.put(key, self.model, self.text)
+
+    def _open(self):
+        """Start the streamed request, retrying until the first chunk arrives.
+
+        Retries stop once output has started; replaying a half-written
+        answer would duplicate tokens on screen.
+        """
+        def first_chunk():
+            response = self.client.chat(
+                model=self.model, messages=self.messages, options=self.options,
+                stream=True, keep_alive=KEEP_ALIVE,
+            )
+            return next(response, None), response
+
+        first, response = with_retries(first_chunk)
+        if first is None:
+            return iter(())
+        return itertools.chain([first], response)
+
+    @property
+    def ttft(self):
+        if self.first_token is None:
+            return None
+        return self.first_token - self.started
+
+    @property
+    def tokens_per_sec(self):
+        if self.cached:
+            return None
+        if self.eval_duration:
+            return self.tokens / (self.eval_duration / 1e9)
+        if self.first_token is None or self.finished <= self.first_token:
+            return None
+        return self.tokens / (self.finished - self.first_token)
+
+    def stats(self):
+        return {
+            'model': self.model,
+            'ttft': self.ttft,
+            'duration': None if self.finished is None else self.finished - self.started,
+            'tokens': self.tokens,
+            'prompt_tokens': self.prompt_tokens,
+            'tokens_per_sec': self.tokens_per_sec,
+            'cached': self.cached,
+        }
+
+    def _record(self):
+        stats = self.stats()
+        with _history_lock:
+            history.append(stats)
+        if stats['duration'] is not None:
+            observe('ollama_chat', stats['duration'], model=self.model, cached=self.cached)
+        if stats['ttft'] is not None and not self.cached:
+            observe('ollama_ttft', stats['ttft'], model=self.model)
+        logger.info('ollama %(model)s ttft=%(ttft)s tokens=%(tokens)s tok/s=%(tokens_per_sec)s', stats)
+
+
+def recent_stats(limit=None):
+    with _history_lock:
+        items = list(history)
+    return items if limit is None else items[-limit:]
+
+
+def complete(model, messages, options=None, client=None, timeout=None, reuse=None, refresh=False, use_cache=True):
+    """Run one chat call to completion and return the stripped response text."""
+    stream = ChatStream(model, messages, options, client=client, timeout=timeout, reuse=reuse, refresh=refresh,
+                        use_cache=use_cache)
+    for _ in stream:
+        pass
+    return stream.text.strip()
+
+
+def batch_complete(model, jobs, options=None, max_workers=4, timeout=None, reuse=None, refresh=False):
+    """Run many chat calls concurrently, yielding results as they finish.
+
+    ``jobs`` maps a caller-chosen key to a message list. Yields
+    ``(key, text, error)`` tuples in completion order; a failed or timed-out
+    job yields its exception instead of aborting the rest.
+    """
+    # httpx enforces the timeout while waiting on a stalled connection,
+    # ChatStream enforces it across a slow but steady stream
+    client = get_client(timeout)
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ollama-batch')
+    try:
+        futures = {
+            pool.submit(complete, model, messages, options, client, timeout, reuse, refresh): key
+            for key, messages in jobs.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except Exception as e:
+                yield key, None, e
+    finally:
+        # a Streamlit rerun can abandon the generator; don't block on queued jobs
+        pool.shutdown(wait=False, cancel_futures=True)
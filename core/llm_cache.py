@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from core.data import CACHE_DIR
+
+# Persistent Ollama response cache. Identical requests (same model, options
+# and messages) are answered from SQLite instead of the GPU server; entries
+# expire after a TTL and the least recently used ones are dropped once the
+# cache grows past its size budget.
+
+CACHE_PATH = CACHE_DIR / 'llm_responses.sqlite'
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(model, messages, options=None):
+    payload = json.dumps(
+        {'model': model, 'options': options or {}, 'messages': list(messages)},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def reusable(options=None):
+    """Default reuse policy: sampled calls at temperature >= 1 must opt in."""
+    return (options or {}).get('temperature', 0.8) < 1
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        # one short-lived connection per operation keeps this safe across threads
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS responses ('
+                        ' key TEXT PRIMARY KEY, model TEXT, response TEXT,'
+                        ' created REAL, last_used REAL, size INTEGER)'
+                    )
+                    conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+                    conn.commit()
+                    self._ready = True
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        'SELECT response FROM responses WHERE key = ? AND created >= ?', (key, now - self.ttl)
+                    ).fetchone()
+                    if row is not None:
+                        conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # a busy or broken cache should cost a miss, not the request
+            logger.warning('response cache read failed: %s', e)
+            return None
+        return row[0] if row else None
+
+    def put(self, key, model, response):
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, model, response, now, now, len(response.encode())),
+                    )
+                    self._evict(conn, now)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning('response cache write failed: %s', e)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        conn.executemany('DELETE FROM responses WHERE key = ?', stale)
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM responses')
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        finally:
+            conn.close()
+        return {'entries': count, 'bytes': size, 'ttl': self.ttl, 'max_bytes': self.max_bytes}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the shared on-disk cache, or None if it cannot be created."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                try:
+                    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    cache = ResponseCache()
+                    cache._connect().close()
+                except (OSError, sqlite3.Error):
+                    return None  # read-only checkout; run uncached
+                _default = cache
+    return _default
@@ -0,0 +1,117 @@
+import dataclasses
+import sys
+import threading
+from collections import OrderedDict
+
+# Bounded, process-wide LRU cache shared by every Streamlit session. Entries
+# are evicted least-recently-used first once either the entry count or the
+# approximate memory budget is exceeded.
+
+_MISSING = object()
+
+
+def sizeof(value):
+    """Rough deep size in bytes for the str/bytes/dict/list, array and dataclass values we cache."""
+    if hasattr(value, 'memory_usage'):
+        # pandas Index/Series/DataFrame (a DataFrame reports per column)
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if hasattr(value, 'nbytes') and hasattr(value, 'base'):
+        # numpy arrays; getsizeof only includes the data when the array owns it
+        return sys.getsizeof(value) + (int(value.nbytes) if value.base is not None else 0)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(sizeof(getattr(value, f.name)) for f in dataclasses.fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, name, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        size = sizeof(value) if size is None else size
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return value  # never cache something that would evict everything
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            # computed outside the lock; two sessions racing on the same key
+            # both compute, the second put simply refreshes the entry
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name, **kwargs):
+    """Return the process-wide cache called ``name``, creating it on first use."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LRUCache(name, **kwargs)
+        return _registry[name]
+
+
+def all_stats():
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.stats() for cache in caches]
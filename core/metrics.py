@@ -0,0 +1,202 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # RSS falls back to /proc or the peak from getrusage
+    psutil = None
+
+# Hot-path instrumentation. Sections of a rerun (data load, filtering, KPIs,
+# each figure, chart serialization, PDF export, Ollama calls) are wrapped in
+# timer()/timed(); every observation updates a per-section summary and lands
+# in a bounded event log tagged with the rerun it belongs to. Gauges hold
+# point-in-time values such as RSS and DataFrame memory. Everything can be
+# exported as JSON lines or Prometheus text.
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'ev_dashboard'
+MAX_EVENTS = 5000
+
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+_summaries = {}  # (section, labels) -> {'count', 'sum', 'min', 'max', 'last'}
+_gauges = {}     # (name, labels) -> value
+_runs = itertools.count(1)
+_local = threading.local()
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def begin_run(page=None):
+    """Start tagging observations from this thread with a new rerun id; returns the id."""
+    _local.run = next(_runs)
+    _local.page = page
+    return _local.run
+
+
+def current_run():
+    return getattr(_local, 'run', None)
+
+
+def observe(section, seconds, **labels):
+    """Record one timing of ``section`` (in seconds)."""
+    labels = _key(labels)
+    event = {
+        'ts': time.time(),
+        'run': current_run(),
+        'page': getattr(_local, 'page', None),
+        'section': section,
+        'seconds': seconds,
+        **dict(labels),
+    }
+    with _lock:
+        _events.append(event)
+        summary = _summaries.get((section, labels))
+        if summary is None:
+            summary = _summaries[(section, labels)] = {'count': 0, 'sum': 0.0, 'min': seconds, 'max': seconds}
+        summary['count'] += 1
+        summary['sum'] += seconds
+        summary['min'] = min(summary['min'], seconds)
+        summary['max'] = max(summary['max'], seconds)
+        summary['last'] = seconds
+    logger.debug('%s %s %.4fs', section, dict(labels), seconds)
+
+
+@contextmanager
+def timer(section, **labels):
+    """Time the ``with`` block as ``section``; recorded even if the block raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(section, time.perf_counter() - started, **labels)
+
+
+def timed(section, **labels):
+    """Decorator form of timer()."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(section, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, _key(labels))] = value
+
+
+def rss_bytes():
+    """Resident set size of this process."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # peak rather than current, but better than nothing (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def sample_memory():
+    rss = rss_bytes()
+    set_gauge('rss_bytes', rss)
+    return rss
+
+
+def frame_bytes(*frames):
+    """Deep memory use of DataFrames (and NumPy arrays) in bytes."""
+    total = 0
+    for frame in frames:
+        if hasattr(frame, 'memory_usage'):
+            total += int(frame.memory_usage(index=True, deep=True).sum())
+        elif hasattr(frame, 'nbytes'):
+            total += int(frame.nbytes)
+    return total
+
+
+def events(run=None, limit=None):
+    """Recent observations, oldest first; ``run`` limits them to one rerun."""
+    with _lock:
+        items = list(_events)
+    if run is not None:
+        items = [e for e in items if e['run'] == run]
+    return items if limit is None else items[-limit:]
+
+
+def summaries():
+    with _lock:
+        return [
+            {'section': section, **dict(labels), **summary}
+            for (section, labels), summary in _summaries.items()
+        ]
+
+
+def gauges():
+    with _lock:
+        return [{'name': name, **dict(labels), 'value': value} for (name, labels), value in _gauges.items()]
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _summaries.clear()
+        _gauges.clear()
+
+
+def to_jsonl(items=None):
+    """Events (default: all recent ones) as JSON lines."""
+    items = events() if items is None else items
+    return ''.join(json.dumps(item, default=str) + '\n' for item in items)
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def to_prometheus():
+    """Section timings as summaries and gauges (plus memo cache counters) in Prometheus text format."""
+    from core.memo import all_stats  # imported late; memo doesn't depend on metrics
+
+    sample_memory()
+    with _lock:
+        timings = sorted(_summaries.items())
+        values = sorted(_gauges.items())
+    lines = [
+        f'# HELP {PREFIX}_section_seconds Time spent in instrumented sections.',
+        f'# TYPE {PREFIX}_section_seconds summary',
+    ]
+    for (section, labels), summary in timings:
+        text = _labels_text((('section', section), *labels))
+        lines.append(f'{PREFIX}_section_seconds_count{text} {summary["count"]}')
+        lines.append(f'{PREFIX}_section_seconds_sum{text} {summary["sum"]:.6f}')
+    for name in sorted({name for (name, _), _ in values}):
+        lines.append(f'# TYPE {PREFIX}_{name} gauge')
+        for (gauge, labels), value in values:
+            if gauge == name:
+                lines.append(f'{PREFIX}_{name}{_labels_text(labels)} {value}')
+    cache_stats = all_stats()
+    for metric, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'),
+                         ('entries', 'gauge'), ('bytes', 'gauge')):
+        name = f'{PREFIX}_cache_{metric}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# TYPE {name} {kind}')
+        for stats in cache_stats:
+            lines.append(f'{name}{_labels_text((("cache", stats["name"]),))} {stats[metric]}')
+    return '\n'.join(lines) + '\n'
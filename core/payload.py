@@ -0,0 +1,182 @@
+import json
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+
+from core.metrics import current_run, set_gauge
+
+# What the pages send to the browser. Figures are cached as compact JSON:
+# line traces longer than MAX_POINTS are downsampled with LTTB (largest
+# triangle three buckets, which keeps the peaks and dips a plain stride would
+# drop), floats are rounded to SIGNIFICANT digits without ever touching their
+# integer part, whole numbers lose their '.0', the template only keeps the
+# trace types the figure uses and the JSON has no spaces. Tables go out a page
+# at a time (core.payload_panel). Every chart and table a rerun sends is
+# counted, and a rerun over PAYLOAD_BUDGET is logged with its largest items.
+
+MAX_POINTS = int(os.getenv('EV_DASHBOARD_MAX_POINTS', '1000'))  # per line trace
+SIGNIFICANT = 6
+PAYLOAD_BUDGET = int(os.getenv('EV_DASHBOARD_PAYLOAD_BUDGET', str(2 * 1024 * 1024)))  # bytes per rerun
+LINE_TRACES = ('scatter', 'scattergl')
+POINT_ATTRIBUTES = ('x', 'y', 'customdata', 'text', 'hovertext')
+
+logger = logging.getLogger(__name__)
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points LTTB keeps from the series (x, y), first and last included."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # the points between the first and last are split into threshold - 2 buckets
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # the third corner is the average of the next bucket (the last point for the last bucket)
+        following = slice(end, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        cx, cy = np.nanmean(x[following]), np.nanmean(y[following])
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        keep[i + 1] = a
+    return keep
+
+
+def _numeric(values):
+    """``values`` as float positions for LTTB (numbers or dates), or None."""
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    try:
+        import pandas as pd
+
+        return pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]').astype('int64').astype(float)
+    except (TypeError, ValueError):
+        return None
+
+
+def downsample_trace(trace, max_points=MAX_POINTS):
+    """Downsample a line trace's per-point arrays in place when it has more than ``max_points``."""
+    x, y = trace.get('x'), trace.get('y')
+    if trace.get('type', 'scatter') not in LINE_TRACES or not isinstance(x, list) or not isinstance(y, list):
+        return trace
+    if len(x) <= max_points or len(x) != len(y):
+        return trace
+    positions, values = _numeric(x), _numeric(y)
+    if positions is None or values is None:
+        return trace
+    keep = lttb(positions, values, max_points)
+    for name in POINT_ATTRIBUTES:
+        points = trace.get(name)
+        if isinstance(points, list) and len(points) == len(x):
+            trace[name] = [points[i] for i in keep]
+    return trace
+
+
+def round_values(values, digits=SIGNIFICANT):
+    """Round numbers to ``digits`` significant digits, keeping their integer part; whole numbers become ints."""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    decimals = np.clip(digits - 1 - np.nan_to_num(magnitude, nan=0.0, posinf=0.0, neginf=0.0), 0, 15)
+    scale = 10.0 ** decimals
+    rounded = np.round(values * scale) / scale
+    # NaN and inf aren't JSON; plotly writes them as null too
+    return [None if not math.isfinite(v) else int(v) if v.is_integer() and abs(v) < 2 ** 53 else v
+            for v in rounded.tolist()]
+
+
+def round_value(value, digits=SIGNIFICANT):
+    """round_values() for a single number."""
+    if not math.isfinite(value):
+        return None
+    if value:
+        value = round(value, max(0, digits - 1 - math.floor(math.log10(abs(value)))))
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compact_values(value, digits=SIGNIFICANT):
+    """Round every number inside a trace's (nested) dicts and lists."""
+    if isinstance(value, dict):
+        return {key: compact_values(item, digits) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(_is_number(item) for item in value):
+            return round_values(value, digits)
+        return [compact_values(item, digits) for item in value]
+    if isinstance(value, float):
+        return round_value(value, digits)
+    return value
+
+
+def compact_spec(spec, max_points=MAX_POINTS, digits=SIGNIFICANT):
+    """Compact a figure dict (as from ``fig.to_json()``) in place and return it."""
+    frames = spec.get('frames', [])
+    traces = spec.get('data', []) + [trace for frame in frames for trace in frame.get('data', [])]
+    for trace in traces:
+        downsample_trace(trace, max_points)
+    spec['data'] = [compact_values(trace, digits) for trace in spec.get('data', [])]
+    for frame in frames:
+        frame['data'] = [compact_values(trace, digits) for trace in frame.get('data', [])]
+    template = spec.get('layout', {}).get('template')
+    if isinstance(template, dict) and 'data' in template:
+        # plotly_dark carries default styles for ~25 trace types; the figure uses one or two
+        used = {trace.get('type', 'scatter') for trace in traces}
+        template['data'] = {kind: styles for kind, styles in template['data'].items() if kind in used}
+    return spec
+
+
+def dumps(spec):
+    return json.dumps(spec, separators=(',', ':'))
+
+
+def compact_json(fig, max_points=MAX_POINTS, digits=SIGNIFICANT):
+    """A plotly Figure as compact JSON, ready for the browser or kaleido."""
+    return dumps(compact_spec(json.loads(fig.to_json()), max_points, digits))
+
+
+_local = threading.local()
+
+
+def _items():
+    run = current_run()
+    if not hasattr(_local, 'items') or _local.run != run:
+        _local.run = run
+        _local.items = []
+    return _local.items
+
+
+def record(kind, name, nbytes):
+    """Count ``nbytes`` sent to the browser by this rerun (``kind`` is e.g. 'chart' or 'table')."""
+    _items().append((kind, name, int(nbytes)))
+
+
+def sent():
+    """``(kind, name, bytes)`` for everything this rerun has sent so far."""
+    return list(_items())
+
+
+def check_budget(page=None, budget=None):
+    """Log this rerun's payload when it is over ``budget`` (default PAYLOAD_BUDGET); returns its total bytes."""
+    budget = PAYLOAD_BUDGET if budget is None else budget
+    items = sent()
+    total = sum(nbytes for _, _, nbytes in items)
+    set_gauge('payload_bytes', total, page=page)
+    if total > budget:
+        largest = sorted(items, key=lambda item: -item[2])[:5]
+        logger.warning(
+            '%s sent %.1f KB in one rerun, over the %.1f KB budget; largest: %s', page or 'page', total / 1024,
+            budget / 1024, ', '.join(f'{kind} {name} {nbytes / 1024:.1f} KB' for kind, name, nbytes in largest)
+        )
+    return total
@@ -0,0 +1,40 @@
+import math
+
+import streamlit as st
+
+from core import payload
+
+# Streamlit side of core.payload: charts and tables that count what they send
+# against the rerun's payload budget. Tables are sent one page at a time
+# instead of the whole frame, so a large pivot costs the same as a small one.
+
+PAGE_SIZE = 50
+
+
+def show_chart(name, fig_json, **kwargs):
+    """st.plotly_chart for a cached figure's (compact) JSON."""
+    import plotly.io as pio
+
+    payload.record('chart', name, len(fig_json))
+    st.plotly_chart(pio.from_json(fig_json), use_container_width=True, **kwargs)
+
+
+def show_table(frame, key, page_size=PAGE_SIZE):
+    """Show ``frame`` ``page_size`` rows at a time, with a page picker when it has more."""
+    pages = max(1, math.ceil(len(frame) / page_size))
+    page = 1
+    if pages > 1:
+        # the frame may have shrunk since the page was picked
+        if st.session_state.get(f'{key}_page', 1) > pages:
+            st.session_state[f'{key}_page'] = 1
+        page = st.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, value=1, step=1,
+                               key=f'{key}_page')
+    start = (page - 1) * page_size
+    rows = frame.iloc[start:start + page_size]
+    # what goes over the wire is the page as Arrow IPC, not its in-memory size
+    from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+    payload.record('table', key, len(convert_anything_to_arrow_bytes(rows)))
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    if pages > 1:
+        st.caption(f'Rows {start + 1:,}-{start + len(rows):,} of {len(frame):,}')
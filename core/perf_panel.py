@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from core import metrics, payload, startup
+from core.llm import recent_stats
+
+# Admin-only sidebar panel showing where the last rerun spent its time, the
+# process's startup and which heavy modules it has loaded, what the rerun sent
+# to the browser, the process memory and recent Ollama latency, with JSON
+# lines / Prometheus exports of everything core.metrics has collected.
+
+ADMIN = os.getenv('EV_DASHBOARD_ADMIN', '0') not in ('0', 'false', 'no')
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _mb(value):
+    return f'{value / 1024 / 1024:,.1f} MB'
+
+
+def show_panel(run):
+    with st.sidebar.expander("Performance", expanded=False):
+        st.metric("Process RSS", _mb(metrics.sample_memory()))
+
+        first = [g for g in metrics.gauges() if g['name'] == 'startup_seconds']
+        if first:
+            st.markdown("**Startup**")
+            st.caption(f"First rerun ({first[0].get('page', '')}): {_ms(first[0]['value']):,} ms")
+            loaded = startup.loaded_modules()
+            st.caption("Loaded: " + (", ".join(f"{m} (rerun {r})" for m, r in loaded.items()) or "-"))
+
+        sent = payload.sent()
+        if sent:
+            st.markdown("**Payload this rerun**")
+            total = sum(nbytes for _, _, nbytes in sent)
+            st.caption(f"{total / 1024:,.1f} KB of the {payload.PAYLOAD_BUDGET / 1024:,.0f} KB budget")
+            frame = pd.DataFrame(sent, columns=['kind', 'name', 'bytes'])
+            frame['KB'] = (frame.pop('bytes') / 1024).round(1)
+            st.dataframe(frame, hide_index=True, use_container_width=True)
+
+        rerun = metrics.events(run=run)
+        if rerun:
+            st.markdown("**Last rerun**")
+            frame = pd.DataFrame(rerun).drop(columns=['ts', 'run', 'page'], errors='ignore')
+            frame['ms'] = frame.pop('seconds').map(_ms)
+            frame = frame.fillna('')
+            st.dataframe(frame, hide_index=True, use_container_width=True)
+
+        totals = metrics.summaries()
+        if totals:
+            st.markdown("**All reruns**")
+            frame = pd.DataFrame(totals)
+            frame['mean ms'] = (frame['sum'] / frame['count']).map(_ms)
+            frame['max ms'] = frame['max'].map(_ms)
+            columns = [c for c in frame.columns if c not in ('sum', 'min', 'max', 'last', 'mean ms', 'max ms')]
+            st.dataframe(frame[columns + ['mean ms', 'max ms']].fillna(''), hide_index=True, use_container_width=True)
+
+        memory = [g for g in metrics.gauges() if g['name'] in ('dataframe_bytes', 'cube_bytes')]
+        if memory:
+            st.markdown("**Data memory**")
+            frame = pd.DataFrame(memory)
+            frame['value'] = frame['value'].map(_mb)
+            st.dataframe(frame, hide_index=True, use_container_width=True)
+
+        calls = recent_stats(10)
+        if calls:
+            st.markdown("**Recent Ollama calls**")
+            st.dataframe(pd.DataFrame(calls), hide_index=True, use_container_width=True)
+
+        st.download_button("Export JSON lines", metrics.to_jsonl(), file_name="ev_dashboard_metrics.jsonl",
+                           mime="application/jsonl")
+        st.download_button("Export Prometheus", metrics.to_prometheus(), file_name="ev_dashboard_metrics.prom",
+                           mime="text/plain")
@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Region dimension table: one row per region name in the dataset with its
+# ISO codes, continent, display name, whether it is an aggregate of other
+# regions and which aggregate it rolls up into. Charts and pages look regions
+# up here instead of keeping their own dicts, and every lookup is a
+# vectorized indexer over categorical codes.
+
+AGGREGATES = ['World', 'Europe', 'EU27', 'Rest of the world']
+EU27_MEMBERS = [
+    'Austria', 'Belgium', 'Bulgaria', 'Croatia', 'Cyprus', 'Czech Republic', 'Denmark', 'Estonia', 'Finland',
+    'France', 'Germany', 'Greece', 'Hungary', 'Ireland', 'Italy', 'Latvia', 'Lithuania', 'Luxembourg', 'Malta',
+    'Netherlands', 'Poland', 'Portugal', 'Romania', 'Slovakia', 'Slovenia', 'Spain', 'Sweden',
+]
+# Direct parent of each region; everything not listed rolls up into World.
+# 'Rest of the world' is World's residual after the listed countries.
+PARENTS = {
+    **{region: 'EU27' for region in EU27_MEMBERS},
+    'EU27': 'Europe', 'Iceland': 'Europe', 'Norway': 'Europe', 'Switzerland': 'Europe', 'United Kingdom': 'Europe',
+    'Europe': 'World',
+}
+CONTINENTS = ['Africa', 'Asia', 'Europe', 'North America', 'Oceania', 'Other', 'South America', 'World']
+COLUMNS = ['region', 'iso2', 'iso3', 'continent', 'name']
+
+_ROWS = [
+    ('Australia', 'AU', 'AUS', 'Oceania', 'Australia'),
+    ('Austria', 'AT', 'AUT', 'Europe', 'Austria'),
+    ('Belgium', 'BE', 'BEL', 'Europe', 'Belgium'),
+    ('Brazil', 'BR', 'BRA', 'South America', 'Brazil'),
+    ('Bulgaria', 'BG', 'BGR', 'Europe', 'Bulgaria'),
+    ('Canada', 'CA', 'CAN', 'North America', 'Canada'),
+    ('Chile', 'CL', 'CHL', 'South America', 'Chile'),
+    ('China', 'CN', 'CHN', 'Asia', 'China'),
+    ('Colombia', 'CO', 'COL', 'South America', 'Colombia'),
+    ('Costa Rica', 'CR', 'CRI', 'North America', 'Costa Rica'),
+    ('Croatia', 'HR', 'HRV', 'Europe', 'Croatia'),
+    ('Cyprus', 'CY', 'CYP', 'Europe', 'Cyprus'),
+    ('Czech Republic', 'CZ', 'CZE', 'Europe', 'Czech Republic'),
+    ('Denmark', 'DK', 'DNK', 'Europe', 'Denmark'),
+    ('Estonia', 'EE', 'EST', 'Europe', 'Estonia'),
+    ('EU27', None, None, 'Europe', 'European Union (27)'),
+    ('Europe', None, None, 'Europe', 'Europe'),
+    ('Finland', 'FI', 'FIN', 'Europe', 'Finland'),
+    ('France', 'FR', 'FRA', 'Europe', 'France'),
+    ('Germany', 'DE', 'DEU', 'Europe', 'Germany'),
+    ('Greece', 'GR', 'GRC', 'Europe', 'Greece'),
+    ('Hungary', 'HU', 'HUN', 'Europe', 'Hungary'),
+    ('Iceland', 'IS', 'ISL', 'Europe', 'Iceland'),
+    ('India', 'IN', 'IND', 'Asia', 'India'),
+    ('Indonesia', 'ID', 'IDN', 'Asia', 'Indonesia'),
+    ('Ireland', 'IE', 'IRL', 'Europe', 'Ireland'),
+    ('Israel', 'IL', 'ISR', 'Asia', 'Israel'),
+    ('Italy', 'IT', 'ITA', 'Europe', 'Italy'),
+    ('Japan', 'JP', 'JPN', 'Asia', 'Japan'),
+    ('Korea', 'KR', 'KOR', 'Asia', 'South Korea'),
+    ('Latvia', 'LV', 'LVA', 'Europe', 'Latvia'),
+    ('Lithuania', 'LT', 'LTU', 'Europe', 'Lithuania'),
+    ('Luxembourg', 'LU', 'LUX', 'Europe', 'Luxembourg'),
+    ('Malta', 'MT', 'MLT', 'Europe', 'Malta'),
+    ('Mexico', 'MX', 'MEX', 'North America', 'Mexico'),
+    ('Netherlands', 'NL', 'NLD', 'Europe', 'Netherlands'),
+    ('New Zealand', 'NZ', 'NZL', 'Oceania', 'New Zealand'),
+    ('Norway', 'NO', 'NOR', 'Europe', 'Norway'),
+    ('Poland', 'PL', 'POL', 'Europe', 'Poland'),
+    ('Portugal', 'PT', 'PRT', 'Europe', 'Portugal'),
+    ('Rest of the world', None, None, 'Other', 'Rest of the world'),
+    ('Romania', 'RO', 'ROU', 'Europe', 'Romania'),
+    ('Seychelles', 'SC', 'SYC', 'Africa', 'Seychelles'),
+    ('Slovakia', 'SK', 'SVK', 'Europe', 'Slovakia'),
+    ('Slovenia', 'SI', 'SVN', 'Europe', 'Slovenia'),
+    ('South Africa', 'ZA', 'ZAF', 'Africa', 'South Africa'),
+    ('Spain', 'ES', 'ESP', 'Europe', 'Spain'),
+    ('Sweden', 'SE', 'SWE', 'Europe', 'Sweden'),
+    ('Switzerland', 'CH', 'CHE', 'Europe', 'Switzerland'),
+    ('Thailand', 'TH', 'THA', 'Asia', 'Thailand'),
+    ('Turkiye', 'TR', 'TUR', 'Asia', 'Türkiye'),
+    ('United Arab Emirates', 'AE', 'ARE', 'Asia', 'United Arab Emirates'),
+    ('United Kingdom', 'GB', 'GBR', 'Europe', 'United Kingdom'),
+    ('USA', 'US', 'USA', 'North America', 'United States'),
+    ('World', None, None, 'World', 'World'),
+]
+
+REGIONS = pd.DataFrame(_ROWS, columns=COLUMNS).assign(
+    continent=lambda df: pd.Categorical(df['continent'], categories=CONTINENTS),
+    aggregate=lambda df: df['region'].isin(AGGREGATES),
+    parent=lambda df: df['region'].map(PARENTS).fillna('World').where(df['region'] != 'World'),
+).set_index('region')
+
+
+def parent(region):
+    if region == 'World':
+        return None
+    return PARENTS.get(region, 'World')
+
+
+@dataclass(frozen=True)
+class RegionDim:
+    """The dimension table's columns aligned to an index of regions (e.g. a cube's region axis).
+
+    Regions missing from the table are treated as countries on the
+    'Other' continent without ISO codes.
+    """
+    regions: pd.Index
+    iso3: np.ndarray        # object array, None where there is no ISO code
+    continent: pd.Categorical
+    aggregate: np.ndarray   # bool
+    name: np.ndarray        # display names
+    ancestors: np.ndarray   # (region, region) bool, [i, j] = region j is a rollup containing region i
+
+    def take(self, regions):
+        """Positions of ``regions`` in this dimension, for indexing its arrays."""
+        return self.regions.get_indexer(regions)
+
+    def top_level(self, mask):
+        """Drop regions whose rollup is also in ``mask``; the rest sum without double counting."""
+        return mask & ~(self.ancestors & mask).any(axis=1)
+
+    def finest(self, mask):
+        """Drop regions with a member also in ``mask``; the most detailed non-overlapping breakdown."""
+        return mask & ~(self.ancestors.T & mask).any(axis=1)
+
+
+def dimension(regions):
+    """Look up every region of ``regions`` in the table at once."""
+    regions = pd.Index(regions, name='region')
+    rows = REGIONS.index.get_indexer(regions)
+    known = rows >= 0
+    table = REGIONS.iloc[np.where(known, rows, 0)]
+    continent = pd.Categorical.from_codes(
+        np.where(known, table['continent'].cat.codes, CONTINENTS.index('Other')), categories=CONTINENTS
+    )
+    # walk each region's parent chain once; the matrix makes every rollup check a single mask op
+    position = {region: i for i, region in enumerate(regions)}
+    ancestors = np.zeros((len(regions), len(regions)), dtype=bool)
+    for i, region in enumerate(regions):
+        up = parent(region)
+        while up is not None:
+            if up in position:
+                ancestors[i, position[up]] = True
+            up = parent(up)
+    return RegionDim(
+        regions=regions,
+        iso3=np.where(known, table['iso3'].to_numpy(dtype=object), None),
+        continent=continent,
+        aggregate=np.where(known, table['aggregate'].to_numpy(), regions.isin(AGGREGATES)),
+        name=np.where(known, table['name'].to_numpy(dtype=object), regions.to_numpy(dtype=object)),
+        ancestors=ancestors,
+    )
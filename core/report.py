@@ -0,0 +1,264 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.memo import get_cache
+from core.metrics import timed
+
+# PDF report pipeline. Figures are rendered to PNG bytes in a process pool
+# (kaleido export is CPU-bound and single-threaded per figure), rendered
+# images are cached by figure content, and the PDF is assembled in memory so
+# concurrent users never share files on disk. plotly/kaleido and fpdf are
+# imported on first render or build, not when a page imports this module.
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv('REPORT_RENDER_WORKERS', str(min(6, os.cpu_count() or 1))))
+RENDER_TIMEOUT = 120
+
+image_cache = get_cache('report_images', max_entries=512, max_bytes=256 * 1024 * 1024)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_png(fig_json):
+    """Render one figure (as plotly JSON) to PNG bytes. Runs in a worker process."""
+    import plotly.io as pio
+
+    return pio.from_json(fig_json).to_image(format='png')
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the Streamlit server is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _image_key(fig_json):
+    return hashlib.sha1(fig_json.encode()).hexdigest()
+
+
+@timed('pdf_render')
+def render_images_batch(figure_sets):
+    """Render a list of ``{title: figure_json}`` dicts to ``{title: png_bytes or None}``.
+
+    Figures already rendered (same JSON, so same selection) come from the
+    image cache; all remaining figures across every set are submitted to the
+    pool at once so the workers stay busy. A figure that fails to render
+    maps to None.
+    """
+    pngs = {}
+    pending = {}
+    for figures in figure_sets:
+        for fig_json in figures.values():
+            key = _image_key(fig_json)
+            if key in pngs or key in pending:
+                continue
+            png = image_cache.get(key)
+            if png is not None:
+                pngs[key] = png
+            else:
+                pending[key] = fig_json
+    if pending:
+        try:
+            pool = get_pool()
+            futures = {key: pool.submit(render_png, fig_json) for key, fig_json in pending.items()}
+            for key, future in futures.items():
+                try:
+                    pngs[key] = image_cache.put(key, future.result(timeout=RENDER_TIMEOUT))
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    logger.warning('failed to render figure %s: %s', key[:8], e)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM); start a fresh pool next time and render
+            # the missing figures here
+            _reset_pool()
+            for key, fig_json in pending.items():
+                if key not in pngs:
+                    try:
+                        pngs[key] = image_cache.put(key, render_png(fig_json))
+                    except Exception as e:
+                        logger.warning('failed to render figure %s: %s', key[:8], e)
+    return [
+        {title: pngs.get(_image_key(fig_json)) for title, fig_json in figures.items()}
+        for figures in figure_sets
+    ]
+
+
+def render_images(figures):
+    """Render one ``{title: figure_json}`` dict; see render_images_batch."""
+    return render_images_batch([figures])[0]
+
+
+def format_kpis(kpis):
+    return {
+        "Total Sales": f"{kpis['total_sales']:,} vehicles",
+        "Average Sales Share": f"{kpis['avg_sales_share']}%",
+        "Average YoY Growth": f"{kpis['avg_yoy_growth']}%",
+        **({"Trend Growth": f"{kpis['trend_growth']}% per year"} if 'trend_growth' in kpis else {}),
+        "Total Regions": f"{kpis['total_regions']}",
+        "Average Sales per Region": f"{kpis['avg_sales_per_region']:,} vehicles",
+        "Average Sales per Year": f"{kpis['avg_sales_per_year']:,} vehicles",
+        **({f"Projected Sales Share {kpis['projected_year']}": f"{kpis['projected_share']}%"}
+           if 'projected_share' in kpis else {}),
+    }
+
+
+@timed('pdf_build')
+def generate_pdf_report(kpis, visualizations, ollama_insights):
+    """Build the report and return it as PDF bytes.
+
+    ``kpis`` maps labels to display values and ``visualizations`` maps
+    titles to PNG bytes (None for figures that could not be rendered).
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=16, style="B")
+    pdf.cell(200, 10, text="EV Sales Dashboard Report", new_x="LMARGIN", new_y="NEXT", align="C")
+    pdf.ln(10)
+    pdf.set_font("Helvetica", size=14, style="B")
+    pdf.cell(200, 10, text="Key Metrics", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=12)
+    for kpi, value in kpis.items():
+        pdf.cell(200, 10, text=f"{kpi}: {value}", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(10)
+    if ollama_insights:
+        pdf.set_font("Helvetica", size=14, style="B")
+        pdf.cell(200, 10, text="AI-Generated Insights", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=12)
+        pdf.multi_cell(0, 10, ollama_insights)
+    pdf.ln(10)
+    pdf.set_font("Helvetica", size=14, style="B")
+    pdf.cell(200, 10, text="Visualizations", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=12)
+    for viz_title, png in visualizations.items():
+        pdf.cell(200, 10, text=viz_title, new_x="LMARGIN", new_y="NEXT")
+        if png:
+            pdf.image(io.BytesIO(png), w=170)
+        else:
+            pdf.cell(200, 10, text=f"(Image for {viz_title} not found)", new_x="LMARGIN", new_y="NEXT")
+        pdf.ln(10)
+    return bytes(pdf.output())
+
+
+def build_report(kpis, figures, ollama_insights=""):
+    """Render ``figures`` (title -> JSON) and return the finished PDF bytes."""
+    return generate_pdf_report(format_kpis(kpis), render_images(figures), ollama_insights)
+
+
+def parse_selection(text):
+    """Parse ``"China,USA:BEV,PHEV"`` (or ``"all"``) into a selection dict."""
+    regions, _, powertrains = text.partition(':')
+    return {
+        'name': text,
+        'regions': None if regions.strip().lower() in ('', 'all') else [r.strip() for r in regions.split(',')],
+        'powertrains': [p.strip() for p in powertrains.split(',')] if powertrains.strip() else None,
+    }
+
+
+def _slug(text):
+    return ''.join(c if c.isalnum() else '_' for c in text).strip('_')[:80] or 'report'
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import time
+    from pathlib import Path
+
+    # imported here so render workers (which import this module) stay light
+    from core.dashboard import INSIGHTS_OPTIONS, get_dashboard_json, insights_messages, map_years, year_span
+    from core.backend import BACKEND, BACKENDS, get_source
+    from core.llm import MODEL, batch_complete
+
+    parser = argparse.ArgumentParser(
+        prog='python -m core.report',
+        description='Generate EV sales dashboard PDF reports for many filter selections.',
+    )
+    parser.add_argument('selections', nargs='*', metavar='SELECTION',
+                        help='"REGION,REGION[:POWERTRAIN,...]", or "all" for the unfiltered dashboard')
+    parser.add_argument('--file', type=Path,
+                        help='JSON list of {"name", "regions", "powertrains"} selections')
+    parser.add_argument('--out', type=Path, default=Path('reports'), help='output directory (default: reports)')
+    parser.add_argument('--insights', action='store_true', help='include AI insights (requires Ollama)')
+    parser.add_argument('--map-year', type=int, help='render the map for this year only')
+    parser.add_argument('--workers', type=int, help='render processes (default: REPORT_RENDER_WORKERS)')
+    parser.add_argument('--mode', default='Cars', help='vehicle mode, e.g. Cars, Buses, Trucks (default: Cars)')
+    parser.add_argument('--scenario', default='Historical',
+                        help='Historical, Projection-STEPS or Projection-APS (default: Historical)')
+    parser.add_argument('--backend', choices=BACKENDS, default=BACKEND,
+                        help='query backend (default: EV_DASHBOARD_BACKEND or pandas)')
+    parser.add_argument('--no-projections', action='store_true', help='leave the trend projections off the charts')
+    args = parser.parse_args(argv)
+
+    selections = [parse_selection(s) for s in args.selections]
+    if args.file:
+        selections += json.loads(args.file.read_text())
+    if not selections:
+        parser.error('no selections given')
+    if args.workers:
+        global RENDER_WORKERS
+        RENDER_WORKERS = args.workers
+
+    started = time.perf_counter()
+    data = get_source(backend=args.backend, partition=(args.mode, args.scenario))
+    if args.map_year is not None and args.map_year not in map_years(data.cube):
+        # projection scenarios only have milestone years, so list them rather than give a range
+        parser.error(f"--map-year {args.map_year} is not in the data; choose one of "
+                     f"{', '.join(map(str, map_years(data.cube)))}")
+    reports = []
+    for selection in selections:
+        name = selection.get('name') or ','.join(selection.get('regions') or ['all'])
+        powertrains = selection.get('powertrains') or list(data.cube.powertrains)
+        result = get_dashboard_json(data, selection.get('regions'), powertrains, map_year=args.map_year,
+                                    projections=not args.no_projections)
+        if result is None:
+            print(f'skipped {name}: no data for this selection')
+            continue
+        reports.append((name, *result))
+
+    insights = {}
+    if args.insights:
+        jobs = {i: insights_messages(kpis, year_span(data.cube), data.partition) for i, (_, kpis, _) in enumerate(reports)}
+        for i, text, error in batch_complete(MODEL, jobs, INSIGHTS_OPTIONS, reuse=True):
+            if error is not None:
+                print(f'insights failed for {reports[i][0]}: {error}')
+            insights[i] = text or "No AI insights available."
+
+    images = render_images_batch([figures for _, _, figures in reports])
+    args.out.mkdir(parents=True, exist_ok=True)
+    for i, ((name, kpis, _), visualizations) in enumerate(zip(reports, images)):
+        path = args.out / f'EV_Sales_Report_{_slug(name)}.pdf'
+        path.write_bytes(generate_pdf_report(format_kpis(kpis), visualizations, insights.get(i, "")))
+        missing = [title for title, png in visualizations.items() if png is None]
+        print(f'wrote {path}' + (f" (missing: {', '.join(missing)})" if missing else ''))
+
+    elapsed = time.perf_counter() - started
+    rate = len(reports) / elapsed * 60 if elapsed else 0.0
+    print(f'{len(reports)} reports in {elapsed:.1f}s ({rate:.1f} reports/min)')
+    if _pool is not None:
+        _pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
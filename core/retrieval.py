@@ -0,0 +1,179 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+# Retrieval layer for the chatbot. Short fact snippets (per region,
+# region x powertrain, region share and per year) are generated from the sales cube
+# once per data load and indexed with BM25; each question only pulls the
+# top-k relevant snippets into the prompt instead of a fixed global summary.
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from', 'has', 'have',
+    'how', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 's', 'the', 'to', 'was', 'were', 'what', 'when',
+    'which', 'who', 'why', 'with',
+}
+# Extra search terms so common alternative names still hit a region's snippets
+ALIASES = {
+    'USA': 'us united states america american',
+    'United Kingdom': 'uk britain british england',
+    'Korea': 'south korea korean',
+    'EU27': 'eu european union',
+    'Europe': 'european',
+    'Turkiye': 'turkey',
+    'Czech Republic': 'czechia',
+    'United Arab Emirates': 'uae emirates',
+    'World': 'global worldwide total',
+    'BEV': 'battery electric',
+    'PHEV': 'plug in hybrid',
+    'FCEV': 'fuel cell hydrogen',
+}
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def _stem(token):
+    # crude suffix stripping so "globally"/"global" and "sales"/"sale" meet
+    if len(token) > 5 and token.endswith('ly'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _fmt(value):
+    return f'{value:,.0f}'
+
+
+def _series(years, values):
+    return '; '.join(f'{year}: {_fmt(value)}' for year, value in zip(years, values))
+
+
+def _terms(*names):
+    return ' '.join(f'{name} {ALIASES.get(name, "")}' for name in names)
+
+
+def build_snippets(cube):
+    """Return ``(text, search_terms)`` fact snippets derived from the sales cube.
+
+    Only the search terms are indexed. Keeping the per-year numbers out of
+    the index stops every time series from matching every year in a question.
+    """
+    years = np.asarray(cube.years)
+    snippets = []
+    for r, region in enumerate(cube.regions):
+        present = cube.present[:, r]
+        if present.any():
+            rows = present.any(axis=1)
+            totals = cube.sales[:, r].sum(axis=1)
+            first, last = years[rows][0], years[rows][-1]
+            text = (
+                f'{region} total EV car sales (all powertrains) by year: {_series(years[rows], totals[rows])}. '
+                f'Cumulative {first}-{last}: {_fmt(totals.sum())} vehicles.'
+            )
+            snippets.append((text, f'{_terms(region)} total all powertrain sales trend growth change'))
+        for p, powertrain in enumerate(cube.powertrains):
+            rows = cube.present[:, r, p]
+            if not rows.any():
+                continue
+            values = cube.sales[rows, r, p]
+            text = (
+                f'{region} {powertrain} EV car sales by year: {_series(years[rows], values)}. '
+                f'Cumulative: {_fmt(values.sum())} vehicles.'
+            )
+            snippets.append((text, f'{_terms(region, powertrain)} sales trend growth change'))
+        share = cube.share[:, r]
+        rows = ~np.isnan(share)
+        if rows.any():
+            values = '; '.join(f'{year}: {value:.1f}%' for year, value in zip(years[rows], share[rows]))
+            snippets.append((
+                f'{region} EV sales share of new car sales by year: {values}.',
+                f'{_terms(region)} share percent market adoption new car',
+            ))
+
+    regional = ~cube.dim.aggregate
+    world = cube.regions.get_indexer(['World'])[0]
+    for y, year in enumerate(years):
+        if not cube.present[y].any():
+            continue
+        parts = []
+        if world >= 0 and cube.present[y, world].any():
+            by_powertrain = ', '.join(
+                f'{powertrain} {_fmt(cube.sales[y, world, p])}'
+                for p, powertrain in enumerate(cube.powertrains) if cube.present[y, world, p]
+            )
+            parts.append(f'World total {_fmt(cube.sales[y, world].sum())} ({by_powertrain})')
+        country_totals = np.where(regional, cube.sales[y].sum(axis=1), 0)
+        top = np.argsort(country_totals)[::-1][:5]
+        parts.append('top countries: ' + ', '.join(
+            f'{cube.regions[i]} {_fmt(country_totals[i])}' for i in top if country_totals[i] > 0
+        ))
+        snippets.append((
+            f'EV car sales in {year}: ' + '; '.join(parts) + '.',
+            f'{year} world global total top countries leading sales',
+        ))
+
+    return snippets
+
+
+@dataclass(frozen=True)
+class BM25Index:
+    texts: list
+    postings: dict       # term -> (doc ids, term frequencies)
+    doc_lengths: np.ndarray
+    avg_length: float
+
+    @classmethod
+    def build(cls, documents):
+        """Index ``(text, search_terms)`` pairs; search returns the matching texts."""
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for doc_id, (_, terms) in enumerate(documents):
+            counts = Counter(tokenize(terms))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings[term][0].append(doc_id)
+                postings[term][1].append(count)
+        postings = {term: (np.array(ids), np.array(tfs, dtype=float)) for term, (ids, tfs) in postings.items()}
+        lengths = np.array(lengths, dtype=float)
+        return cls([text for text, _ in documents], postings, lengths, float(lengths.mean()) if len(lengths) else 0.0)
+
+    def search(self, query, k=6):
+        """Return the top-``k`` snippet texts for ``query``, best first."""
+        scores = np.zeros(len(self.texts))
+        n = len(self.texts)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avg_length or 1))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[ids])
+        top = np.argsort(scores)[::-1][:k]
+        return [self.texts[i] for i in top if scores[i] > 0]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_index(data):
+    """Return the BM25 index for ``data``, building it once per data load."""
+    key = (data.signature, data.partition)
+    index = _indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = BM25Index.build(build_snippets(data.cube))
+                _indexes.clear()  # only the current data version is ever queried
+                _indexes[key] = index
+    return index
@@ -0,0 +1,129 @@
+import ast
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from core.metrics import observe, set_gauge
+
+# Startup timing. In the app, the first rerun of a process (what the first
+# user of a fresh replica waits for: app.py's imports, the page's imports and
+# its first data load) is recorded as 'startup', and each rerun notes which
+# heavy dependencies have been imported so far, so the performance panel
+# shows what a page actually pulled in. Run as a module, it measures the cold
+# import time of app.py plus each page in fresh interpreters with
+# ``python -X importtime`` and lists the slowest packages:
+#
+#   python -m core.startup
+#   python -m core.startup --repeat 5 --top 15
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+ENTRY = 'app.py'
+PAGES = ['views/sales_dashboard.py', 'views/chatbot.py', 'views/market.py']
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'duckdb', 'plotly', 'kaleido', 'fpdf', 'ollama', 'httpx']
+REPEAT = 3
+TOP = 10
+
+_imported = time.perf_counter()  # app.py imports this first, so this is close to the first rerun's start
+_startup_recorded = False
+_loaded = {}  # heavy module -> rerun it was first seen after
+
+
+def record_rerun(run, page=None):
+    """Call at the end of every rerun; the first call of the process records the startup time."""
+    global _startup_recorded
+    if not _startup_recorded:
+        _startup_recorded = True
+        seconds = time.perf_counter() - _imported
+        observe('startup', seconds, page=page)
+        set_gauge('startup_seconds', seconds, page=page)
+    for module in HEAVY_MODULES:
+        if module not in _loaded and module in sys.modules:
+            _loaded[module] = run
+
+
+def loaded_modules():
+    """Heavy modules imported so far, mapped to the rerun after which each was first seen."""
+    return dict(_loaded)
+
+
+def top_level_imports(path):
+    """The module-level import statements of a script, as source."""
+    tree = ast.parse(Path(path).read_text())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def parse_importtime(stderr, skip='streamlit'):
+    """Per-package self time (us) and the total (us) from ``-X importtime`` output.
+
+    Everything up to and including the top-level import of ``skip`` is left
+    out; the Streamlit server has already imported it when app.py runs.
+    """
+    packages = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        top = not name[1:].startswith(' ')
+        name = name.strip()
+        if top and name == skip:
+            packages, total = {}, 0
+            continue
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if top:
+            total += int(cumulative)
+    return packages, total
+
+
+def measure(scripts, python=sys.executable):
+    """Cold import time of ``scripts``' top-level imports, run in one fresh interpreter."""
+    source = '\n'.join(['import streamlit', *(line for script in scripts for line in top_level_imports(script))])
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [str(ROOT_DIR), os.getenv('PYTHONPATH')]))}
+    result = subprocess.run([python, '-X', 'importtime', '-c', source], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def report(repeat=REPEAT, top=TOP):
+    """Best-of-``repeat`` cold import times for app.py and for app.py plus each page."""
+    rows = []
+    for label, scripts in [(ENTRY, [ENTRY]), *((page, [ENTRY, page]) for page in PAGES)]:
+        runs = [measure([ROOT_DIR / script for script in scripts]) for _ in range(repeat)]
+        packages, total = min(runs, key=lambda run: run[1])
+        rows.append({
+            'entry': label,
+            'ms': total / 1000,
+            'heavy_modules': [module for module in HEAVY_MODULES if module in packages],
+            'slowest': sorted(((name, us / 1000) for name, us in packages.items()), key=lambda p: -p[1])[:top],
+        })
+    return rows
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog='python -m core.startup',
+                                     description='Cold import time of app.py and each page (streamlit excluded).')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help=f'runs per entry, best kept (default: {REPEAT})')
+    parser.add_argument('--top', type=int, default=TOP, help=f'slowest packages listed per entry (default: {TOP})')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    rows = report(args.repeat, args.top)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    for row in rows:
+        print(f"{row['entry']:<28} {row['ms']:8.0f} ms   loads: {', '.join(row['heavy_modules']) or '-'}")
+        for name, ms in row['slowest']:
+            print(f'    {name:<24} {ms:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
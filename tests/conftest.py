@@ -0,0 +1,21 @@
+import shutil
+
+import pytest
+
+from core import backend, data
+
+# Every test works on its own copy of the dataset, with its own cache, so the
+# real data/.cache is never touched. The folder name has a quote in it, which
+# the DuckDB backend has to put into SQL.
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """A copy of the bundled CSV in a fresh folder; returns its path."""
+    monkeypatch.setattr(data, 'CACHE_DIR', tmp_path / '.cache')
+    monkeypatch.setattr(backend, 'CACHE_DIR', tmp_path / '.cache')
+    folder = tmp_path / "o'brien"
+    folder.mkdir()
+    path = folder / data.DATA_PATH.name
+    shutil.copyfile(data.DATA_PATH, path)
+    return path
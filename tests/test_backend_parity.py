@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import dashboard
+from core.backend import get_source
+
+pytest.importorskip('duckdb')
+
+SELECTIONS = [
+    (None, None),  # Select All: World, the aggregates and their countries
+    (['China', 'USA', 'Germany'], ['BEV']),
+    (['Europe', 'France', 'Germany', 'India'], ['BEV', 'PHEV']),
+]
+
+
+def sources(path):
+    return get_source(path, 'pandas').cube, get_source(path, 'duckdb').cube
+
+
+def assert_same(pandas_frame, duckdb_frame):
+    if isinstance(pandas_frame, pd.Series):
+        pd.testing.assert_series_equal(pandas_frame, duckdb_frame, check_dtype=False, check_names=False,
+                                       check_index_type=False)
+    else:
+        pd.testing.assert_frame_equal(pandas_frame, duckdb_frame, check_dtype=False, check_names=False,
+                                      check_index_type=False, check_column_type=False)
+
+
+@pytest.mark.parametrize('regions, powertrains', SELECTIONS)
+def test_chart_frames_match(dataset, regions, powertrains):
+    frames = []
+    for cube in sources(dataset):
+        selection = dashboard.select(cube, regions, powertrains)
+        frames.append({
+            'by_year': selection.top_level().by_year(),
+            'by_region': selection.countries().by_region(),
+            'by_year_region': selection.finest().by_year_region(),
+            'by_year_powertrain': selection.top_level().by_year_powertrain(),
+        })
+    for name in frames[0]:
+        assert_same(frames[0][name], frames[1][name])
+
+
+@pytest.mark.parametrize('regions, powertrains', SELECTIONS)
+def test_kpis_match(dataset, regions, powertrains):
+    kpis = [dashboard.compute_kpis(cube, dashboard.select(cube, regions, powertrains), regions)
+            for cube in sources(dataset)]
+    assert kpis[0].keys() == kpis[1].keys()
+    for name in kpis[0]:
+        assert np.isclose(kpis[0][name], kpis[1][name]), name
+
+
+def test_deltas_match(dataset):
+    delta = dataset.parent / 'deltas' / "0001_o'neill.csv"
+    delta.parent.mkdir()
+    pd.DataFrame({
+        'region': ['China', 'China'], 'category': 'Historical', 'parameter': ['EV sales', 'EV sales share'],
+        'mode': 'Cars', 'powertrain': ['BEV', 'EV'], 'year': 2024, 'unit': ['Vehicles', 'percent'],
+        'value': [7_000_000, 45.0],
+    }).to_csv(delta, index=False)
+    pandas_cube, duckdb_cube = sources(dataset)
+    assert_same(pandas_cube.select().by_year(), duckdb_cube.select().by_year())
+    assert pandas_cube.select(['China']).avg_share() == pytest.approx(duckdb_cube.select(['China']).avg_share())
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from core.conversation import ConversationMemory
+
+
+def summarize(summary, turns):
+    return f'{summary}+{len(turns)}'
+
+
+def test_background_fold_applies_on_a_later_window():
+    memory = ConversationMemory({}, budget=100, summarizer=summarize)
+    for i in range(6):
+        memory.append('user' if i % 2 == 0 else 'assistant', 'word ' * 40)
+    jobs = []
+
+    def submit(summarizer, summary, turns):
+        jobs.append(SimpleNamespace(pending=True, error=None, result=None, call=(summarizer, summary, turns)))
+        return jobs[-1]
+
+    memory.compact_later(submit)
+    assert len(jobs) == 1 and memory.state['chat_summarized'] == 0
+    # still running: the next request goes out without waiting for it
+    assert memory.window() == ('', memory.messages)
+
+    job = jobs[0]
+    summarizer, summary, turns = job.call
+    job.result, job.pending = summarizer(summary, turns), False
+    summary, recent = memory.window()
+    assert summary == f'+{len(turns)}'
+    assert recent == memory.messages[len(turns):]
+    assert 'chat_folding' not in memory.state
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from core.data import KEY_COLUMNS, get_data, ingest
+
+# Merging a delta into loaded data (core.data.apply_delta) only re-pivots the
+# (year, region) partitions the delta touches; the result must be the same as
+# loading a CSV that already has the delta's rows.
+
+DELTA = pd.DataFrame([
+    # replaces existing rows
+    ('China', 'Historical', 'EV sales', 'Cars', 'BEV', 2023, 'Vehicles', 6_000_000.0),
+    ('China', 'Historical', 'EV sales share', 'Cars', 'EV', 2023, 'percent', 40.0),
+    # new year and new region
+    ('China', 'Historical', 'EV sales', 'Cars', 'BEV', 2024, 'Vehicles', 7_000_000.0),
+    ('China', 'Historical', 'EV sales', 'Cars', 'PHEV', 2024, 'Vehicles', 4_000_000.0),
+    ('China', 'Historical', 'EV sales share', 'Cars', 'EV', 2024, 'percent', 48.0),
+    ('Atlantis', 'Historical', 'EV sales', 'Cars', 'BEV', 2022, 'Vehicles', 1_000.0),
+    # another partition, not part of the loaded one
+    ('China', 'Historical', 'EV sales', 'Buses', 'BEV', 2024, 'Vehicles', 50_000.0),
+], columns=['region', 'category', 'parameter', 'mode', 'powertrain', 'year', 'unit', 'value'])
+
+
+def test_merged_delta_matches_full_reload(dataset, tmp_path):
+    get_data(dataset)  # loaded before the delta arrives, so the delta is merged in
+    delta = dataset.parent / 'deltas' / '0001_update.csv'
+    delta.parent.mkdir()
+    DELTA.to_csv(delta, index=False)
+    merged = get_data(dataset)
+    assert merged.signature[1]
+
+    base = pd.read_csv(dataset)
+    full = pd.concat([base, DELTA], ignore_index=True).drop_duplicates(KEY_COLUMNS, keep='last')
+    reload_path = tmp_path / 'reload' / dataset.name
+    reload_path.parent.mkdir()
+    full.to_csv(reload_path, index=False)
+    reloaded = get_data(reload_path)
+
+    rows = [data.df.astype({'region': str}).sort_values(KEY_COLUMNS, ignore_index=True)
+            for data in (merged, reloaded)]
+    pd.testing.assert_frame_equal(*rows, check_categorical=False)
+    pd.testing.assert_frame_equal(merged.sales_df, reloaded.sales_df)
+    pd.testing.assert_frame_equal(merged.sales_share_df, reloaded.sales_share_df)
+    for axis in ('years', 'regions', 'powertrains'):
+        pd.testing.assert_index_equal(getattr(merged.cube, axis), getattr(reloaded.cube, axis))
+    for name, a, b in zip(('sales', 'present', 'share'), merged.cube.dense(), reloaded.cube.dense()):
+        assert np.array_equal(a, b, equal_nan=True), name
+
+
+def test_ingest_numbers_after_the_highest_delta(dataset, tmp_path):
+    source = tmp_path / 'rows.csv'
+    DELTA.to_csv(source, index=False)
+    first, _ = ingest(source, dataset)
+    second, _ = ingest(source, dataset)
+    first.unlink()
+    third, _ = ingest(source, dataset)
+    assert [p.name[:4] for p in (first, second, third)] == ['0001', '0002', '0003']
+    assert second.exists()
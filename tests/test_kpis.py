@@ -0,0 +1,27 @@
+import pytest
+
+from core import dashboard
+from core.backend import get_source
+from core.report import format_kpis
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'duckdb'])
+def test_select_all_region_kpis(dataset, backend):
+    if backend == 'duckdb':
+        pytest.importorskip('duckdb')
+    cube = get_source(dataset, backend).cube
+    kpis = dashboard.compute_kpis(cube, dashboard.select(cube, None, None), None)
+    # World, the aggregates and the countries are all selected; both region KPIs count the countries
+    finest = cube.select().finest()
+    assert kpis['total_regions'] == finest.region_count() == 49
+    assert kpis['avg_sales_per_region'] == pytest.approx(finest.total() / 49, abs=0.01)
+    assert kpis['avg_sales_per_region'] < kpis['total_sales'] / 10
+
+
+def test_milestone_partition_has_no_trend_growth(dataset):
+    # Projection-STEPS only has milestone years, too few for the recent-years trend
+    cube = get_source(dataset, 'pandas', ('Cars', 'Projection-STEPS')).cube
+    kpis = dashboard.compute_kpis(cube, cube.select(), None)
+    assert 'trend_growth' not in kpis
+    assert 'Trend Growth' not in format_kpis(kpis)
+    assert 'nan' not in dashboard.insights_messages(kpis, '2010-2035')[1]['content']
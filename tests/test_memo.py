@@ -0,0 +1,18 @@
+import numpy as np
+
+from core.data import get_data
+from core.forecast import get_forecast
+from core.memo import LRUCache, sizeof
+
+
+def test_sizeof_counts_forecast_arrays(dataset):
+    forecast = get_forecast(get_data(dataset))
+    arrays = forecast.sales.nbytes + forecast.modeled.nbytes + forecast.growth.nbytes + forecast.share.nbytes
+    assert sizeof(forecast) > arrays
+
+
+def test_max_bytes_evicts_arrays():
+    cache = LRUCache('arrays', max_bytes=3 * 8_000)
+    for key in range(5):
+        cache.put(key, np.zeros(1_000))
+    assert len(cache) == 2 and cache.stats()['evictions'] == 3
@@ -1,30 +1,28 @@
-import pandas as pd
 import streamlit as st
-import ollama
+
+from core import jobs
+from core.conversation import ConversationMemory, message_tokens
+from core.dashboard import compute_kpis, year_span
+from core.data import get_data
+from core.llm import MODEL, ChatStream
+from core.retrieval import get_index
+
+# Number of retrieved fact snippets sent with each question
+RETRIEVAL_K = 6
 
 # Streamlit UI setup
 st.title("EV Sales Chatbot")
 
-# Load dataset
-df = pd.read_csv('data/global_ev_sales_2010_2024.csv')
-
-# Filter for 'Cars' mode and 'Historical' category
-df_cars = df[(df['mode'] == 'Cars') & (df['category'] == 'Historical')]
+# Load dataset (shared, cached per process)
+data = get_data()
 
-# Calculate KPIs
-sales_df = df_cars[df_cars['parameter'] == 'EV sales'].pivot_table(
-    values='value', index=['year', 'region', 'powertrain'], columns='unit', aggfunc='sum'
-).reset_index()
-total_sales = round(sales_df['Vehicles'].sum(), 2)
-total_regions = sales_df['region'].nunique()
-avg_sales_per_year = round(sales_df.groupby('year')['Vehicles'].sum().mean(), 2)
-sales_share_df = df_cars[df_cars['parameter'] == 'EV sales share'].pivot_table(
-    values='value', index=['year', 'region'], columns='unit', aggfunc='sum'
-).reset_index()
-avg_sales_share = round(sales_share_df['percent'].mean(), 2)
-sales_by_powertrain = sales_df.groupby('powertrain')['Vehicles'].sum().reset_index()
-yoy_growth = sales_df[sales_df['region'] == 'World'].groupby('year')['Vehicles'].sum().pct_change().mean() * 100
-avg_yoy_growth = round(yoy_growth, 2)
+# Calculate KPIs (same definitions as the dashboard's unfiltered view)
+kpis = compute_kpis(data.cube, data.cube.select(), None)
+total_sales = kpis['total_sales']
+total_regions = kpis['total_regions']
+avg_sales_per_year = kpis['avg_sales_per_year']
+avg_sales_share = kpis['avg_sales_share']
+avg_yoy_growth = kpis['avg_yoy_growth']
 
 # Initialize session state keys
 if "total_sales" not in st.session_state:
@@ -35,28 +33,32 @@ if "avg_sales_per_year" not in st.session_state:
     st.session_state.avg_sales_per_year = avg_sales_per_year
 if "avg_sales_share" not in st.session_state:
     st.session_state.avg_sales_share = avg_sales_share
-if "sales_by_powertrain" not in st.session_state:
-    st.session_state.sales_by_powertrain = sales_by_powertrain
 if "avg_yoy_growth" not in st.session_state:
     st.session_state.avg_yoy_growth = avg_yoy_growth
 
 # Define data summary context
+span = year_span(data.cube)
 data_summary = (
-    f"EV Sales Data Summary (2010-2024):\n"
+    f"EV Sales Data Summary ({span}):\n"
     f"Total EV Sales: {st.session_state.total_sales:,} vehicles\n"
     f"Number of Regions: {st.session_state.total_regions}\n"
     f"Average Sales per Year: {st.session_state.avg_sales_per_year:,} vehicles\n"
     f"Average EV Sales Share: {st.session_state.avg_sales_share}% of total vehicle sales\n"
     f"Average YoY Sales Growth: {st.session_state.avg_yoy_growth}%\n"
-    f"Sales by Powertrain:\n{st.session_state.sales_by_powertrain.to_string(index=False)}\n\n"
-    "You are an intelligent assistant providing insights on global EV sales trends (2010-2024). "
+    "\n"
+    f"You are an intelligent assistant providing insights on global EV sales trends ({span}). "
     "Answer queries about sales trends, powertrain performance, regional adoption, or growth rates. "
     "Provide actionable insights to guide EV market strategies."
 )
 
-# Initialize chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+
+def summarize_in_background(summarizer, summary, turns):
+    return jobs.submit(jobs.session_id(), 'chat_summary', lambda job: summarizer(summary, turns),
+                       label='Summarizing the conversation')
+
+
+# Initialize chat history (bounded; older turns are folded into a summary)
+memory = ConversationMemory(st.session_state)
 
 # Display chat messages
 for message in st.session_state.messages:
@@ -65,28 +67,23 @@ for message in st.session_state.messages:
 
 # Accept user input
 if prompt := st.chat_input("Ask a question about EV sales data:"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
+    # Fact snippets indexed once per data load, on the first question; each question retrieves its own context
+    index = get_index(data)
+    context = "\n".join(f"- {snippet}" for snippet in index.search(prompt, k=RETRIEVAL_K))
+    # Build the prompt before storing the new question so it isn't sent twice
+    messages = memory.prompt_messages(
+        'You are an expert in EV market analysis.',
+        f"{data_summary}\n\nRelevant data:\n{context or '- (no matching records)'}",
+        prompt
+    )
     try:
         with st.chat_message("assistant"):
-            response = ollama.chat(
-                model='llama3.1:8b',
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': 'You are an expert in EV market analysis.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': data_summary
-                    },
-                    {
-                        'role': 'user',
-                        'content': f"Answer this: {prompt}"
-                    }
-                ],
+            response = ChatStream(
+                model=MODEL,
+                messages=messages,
                 options={
                     'temperature': 0.7,
                     'top_p': 0.95,
@@ -94,8 +91,16 @@ if prompt := st.chat_input("Ask a question about EV sales data:"):
                     'max_tokens': 550
                 }
             )
-            assistant_response = response['message']['content'].strip()
-            st.markdown(assistant_response)
-            st.session_state.messages.append({"role": "assistant", "content": assistant_response})
+            assistant_response = st.write_stream(response).strip()
+            prompt_tokens = response.prompt_tokens or message_tokens(messages)
+            st.caption(f"Prompt: {prompt_tokens:,} tokens" + ("" if response.prompt_tokens else " (estimated)"))
+            if context:
+                with st.expander("Data used for this answer"):
+                    st.markdown(context)
+            # stored only once answered, so a failed request doesn't leave a dangling question
+            memory.append("user", prompt)
+            memory.append("assistant", assistant_response)
+        # fold older turns in the background; the next question picks up the summary
+        memory.compact_later(summarize_in_background)
     except Exception as e:
         st.error(f"Error generating response: {e}")
\ No newline at end of file
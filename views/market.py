@@ -1,60 +1,47 @@
+import numpy as np
 import streamlit as st
 import pandas as pd
-import ollama
 
-# Load dataset
-file_path = "data/global_ev_sales_2010_2024.csv"
+from core.campaigns import get_campaign_store
+from core.data import COLUMNS, build, get_data
+from core.job_panel import is_running, show_job, start_job
+from core.jobs import DONE
+from core.llm import MODEL, batch_complete
+from core.payload_panel import show_table
+
+# Load dataset (shared, cached per process)
 def load_data():
     try:
-        return pd.read_csv(file_path)
+        return get_data()
     except FileNotFoundError:
         st.write("File not found, creating empty DataFrame.")
-        return pd.DataFrame(columns=['region', 'category', 'parameter', 'mode', 'powertrain', 'year', 'unit', 'value'])
-
-df = load_data()
-df_cars = df[(df['mode'] == 'Cars') & (df['category'] == 'Historical')]
-sales_df = df_cars[df_cars['parameter'] == 'EV sales'].pivot_table(
-    values='value', index=['year', 'region', 'powertrain'], columns='unit', aggfunc='sum'
-).reset_index()
-
-# Map regions to continents
-continent_map = {
-    'Australia': 'Oceania', 'Austria': 'Europe', 'Belgium': 'Europe', 'Brazil': 'South America',
-    'Bulgaria': 'Europe', 'Canada': 'North America', 'Chile': 'South America', 'China': 'Asia',
-    'Colombia': 'South America', 'Costa Rica': 'North America', 'Croatia': 'Europe', 'Cyprus': 'Europe',
-    'Czech Republic': 'Europe', 'Denmark': 'Europe', 'Estonia': 'Europe', 'EU27': 'Europe',
-    'Europe': 'Europe', 'Finland': 'Europe', 'France': 'Europe', 'Germany': 'Europe',
-    'Greece': 'Europe', 'Hungary': 'Europe', 'Iceland': 'Europe', 'India': 'Asia',
-    'Indonesia': 'Asia', 'Ireland': 'Europe', 'Israel': 'Asia', 'Italy': 'Europe',
-    'Japan': 'Asia', 'Korea': 'Asia', 'Netherlands': 'Europe', 'New Zealand': 'Oceania',
-    'Norway': 'Europe', 'Poland': 'Europe', 'Portugal': 'Europe', 'Rest of the world': 'Other',
-    'Romania': 'Europe', 'Seychelles': 'Africa', 'Slovakia': 'Europe', 'Slovenia': 'Europe',
-    'South Africa': 'Africa', 'Spain': 'Europe', 'Sweden': 'Europe', 'Switzerland': 'Europe',
-    'Thailand': 'Asia', 'Turkiye': 'Asia', 'United Arab Emirates': 'Asia', 'United Kingdom': 'Europe',
-    'USA': 'North America', 'World': 'World'
-}
-sales_df['continent'] = sales_df['region'].map(continent_map).fillna('Other')
+        return build(pd.DataFrame(columns=COLUMNS))
+
+data = load_data()
+sales_df = data.sales_df
 
-# Display data
+# Display data, a page at a time
 st.subheader("EV Sales Data")
-st.write(sales_df[['year', 'region', 'powertrain', 'Vehicles']])
+show_table(sales_df[['year', 'region', 'powertrain', 'Vehicles']], 'sales_table')
 
-# Performance classification by region
-region_performance = sales_df.groupby('region')['Vehicles'].sum().reset_index()
+# Performance classification by country; aggregates like World or EU27 would skew the median
+region_performance = data.cube.select().countries().by_region().reset_index()
 threshold = region_performance['Vehicles'].median()
-region_performance['Performance'] = region_performance['Vehicles'].apply(
-    lambda x: "High Performing" if x > threshold else "Low Performing"
+region_performance['Performance'] = np.where(
+    region_performance['Vehicles'] > threshold, "High Performing", "Low Performing"
 )
 st.session_state.region_performance = region_performance
 
 # Display performance
 high_performing_regions = region_performance[region_performance['Performance'] == 'High Performing']
 st.write("### High Performing Regions")
-st.write(high_performing_regions[['region', 'Vehicles']])
+show_table(high_performing_regions[['region', 'Vehicles']], 'high_performing_table')
 
 low_performing_regions = region_performance[region_performance['Performance'] == 'Low Performing']
 st.write("### Low Performing Regions")
-st.write(low_performing_regions[['region', 'Vehicles']])
+show_table(low_performing_regions[['region', 'Vehicles']], 'low_performing_table')
+
+store = get_campaign_store()
 
 # Form for creating promotional campaigns
 operation = st.radio("Choose Operation", ('Create New Campaign',))
@@ -66,58 +53,147 @@ with st.form(key='campaign_form'):
     submit_button = st.form_submit_button(label="Submit")
 
     if submit_button:
-        new_campaign = {
-            'Region': new_region,
-            'Description': new_description,
-            'Tagline': new_tagline,
-            'Budget': new_budget
-        }
-        campaign_df = pd.DataFrame([new_campaign])
-        campaign_df.to_csv('data/campaigns.csv', mode='a', index=False, header=not pd.io.common.file_exists('data/campaigns.csv'))
-        st.success("Campaign added successfully!")
+        try:
+            store.add_campaign(new_region, new_description, new_tagline, new_budget)
+            st.success("Campaign added successfully!")
+        except Exception as e:
+            st.error(f"Could not save the campaign: {e}")
 
 # Ollama integration for promotional content
-def generate_promotion(content_type, campaign_data):
+PROMOTION_OPTIONS = {
+    'temperature': 1,
+    'top_p': 0.95,
+    'top_k': 40,
+    'max_tokens': 8192
+}
+
+def promotion_messages(content_type, campaign_data):
+    prompt = (
+        f"Create a one-paragraph {content_type} for an EV adoption campaign:\n"
+        f"Region: {campaign_data['region']}\n"
+        f"Description: {campaign_data['description']}\n"
+        f"Tagline: {campaign_data['tagline']}\n"
+        f"Budget: ${campaign_data['budget']:,}\n"
+    )
+    return [
+        {
+            'role': 'system',
+            'content': 'You are an expert marketing assistant creating promotional content for EV adoption.'
+        },
+        {
+            'role': 'user',
+            'content': prompt
+        }
+    ]
+
+def generate_promotions(job, content_type, campaigns, campaign_ids, max_workers, timeout, refresh=False):
+    # Requests run concurrently in the background; the page shows each result as it finishes
+    jobs = {i: promotion_messages(content_type, campaign_data) for i, campaign_data in enumerate(campaigns)}
+    results = batch_complete(
+        MODEL, jobs, PROMOTION_OPTIONS, max_workers=max_workers, timeout=timeout,
+        reuse=True, refresh=refresh
+    )
+    promotions, errors = [], []
     try:
-        prompt = (
-            f"Create a one-paragraph {content_type} for an EV adoption campaign:\n"
-            f"Region: {campaign_data['Region']}\n"
-            f"Description: {campaign_data['Description']}\n"
-            f"Tagline: {campaign_data['Tagline']}\n"
-            f"Budget: ${campaign_data['Budget']:,}\n"
-        )
-        response = ollama.chat(
-            model='llama3.1:8b',
-            messages=[
-                {
-                    'role': 'system',
-                    'content': 'You are an expert marketing assistant creating promotional content for EV adoption.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            options={
-                'temperature': 1,
-                'top_p': 0.95,
-                'top_k': 40,
-                'max_tokens': 8192
-            }
-        )
-        st.subheader(f"{content_type} for {campaign_data['Region']}")
-        promotion_text = response['message']['content'].strip()
-        st.write(promotion_text)
-        st.session_state["ollama_promotion"] = promotion_text
-    except Exception as e:
-        st.error(f"Error generating promotion: {e}")
-
-if st.button("Generate promotional content for Low Performing Regions"):
-    for _, region in low_performing_regions.iterrows():
-        campaign_data = {
-            'Region': region['region'],
-            'Description': f"Promote EV adoption in {region['region']} with incentives.",
-            'Tagline': "Drive Electric, Save the Planet!",
-            'Budget': 10000.0
+        for done, (i, promotion_text, error) in enumerate(results, start=1):
+            if job.cancelled:
+                break
+            region = campaigns[i]['region']
+            if error is not None:
+                errors.append((region, str(error)))
+            else:
+                promotions.append({
+                    'campaign_id': campaign_ids[i], 'region': region, 'content_type': content_type,
+                    'model': MODEL, 'text': promotion_text
+                })
+            job.report(
+                progress=done / len(jobs), message=f"Generated {done} of {len(jobs)} promotions",
+                partial={'promotions': list(promotions), 'errors': list(errors)}
+            )
+    finally:
+        results.close()
+        # one write for the whole batch, including what finished before a cancel
+        if promotions:
+            store.add_promotions(promotions)
+    return {'promotions': promotions, 'errors': errors}
+
+def show_promotions(job):
+    output = job.result if job.status == DONE else job.partial
+    if not output:
+        return
+    for region, error in output['errors']:
+        st.error(f"Error generating promotion for {region}: {error}")
+    for promotion in output['promotions']:
+        st.subheader(f"{promotion['content_type']} for {promotion['region']}")
+        st.write(promotion['text'])
+    if job.status == DONE and output['promotions']:
+        st.session_state["ollama_promotion"] = output['promotions'][-1]['text']
+
+with st.expander("Batch generation settings"):
+    batch_concurrency = st.slider("Concurrent requests", min_value=1, max_value=16, value=4)
+    batch_timeout = st.number_input("Timeout per region (seconds)", min_value=5, value=120, step=5)
+    batch_regenerate = st.checkbox("Regenerate (ignore cached promotions)", value=False)
+
+if st.button("Generate promotional content for Low Performing Regions", disabled=is_running('promotions_job')):
+    campaigns = [
+        {
+            'region': region,
+            'description': f"Promote EV adoption in {region} with incentives.",
+            'tagline': "Drive Electric, Save the Planet!",
+            'budget': 10000.0
         }
-        generate_promotion("Social Media Promotion Text", campaign_data)
\ No newline at end of file
+        for region in low_performing_regions['region']
+    ]
+    try:
+        campaign_ids = store.add_campaigns(campaigns, source='batch') if campaigns else []
+    except Exception as e:
+        st.error(f"Could not save the campaigns: {e}")
+        campaign_ids = []
+    if campaign_ids:
+        start_job(
+            'promotions_job', 'promotions', generate_promotions, "Social Media Promotion Text", campaigns,
+            campaign_ids, batch_concurrency, batch_timeout, batch_regenerate, label="Generating promotions"
+        )
+show_job('promotions_job', show_promotions)
+
+# Campaign history, newest first, one page at a time
+st.write("### Campaign History")
+filter_cols = st.columns([2, 1, 1, 2])
+history_regions = filter_cols[0].multiselect("Regions", options=store.regions())
+history_min = filter_cols[1].number_input("Min budget ($)", value=0.0, min_value=0.0, step=1000.0)
+history_max = filter_cols[2].number_input("Max budget ($)", value=0.0, min_value=0.0, step=1000.0,
+                                          help="0 for no limit")
+history_search = filter_cols[3].text_input("Search", placeholder="Region, description or tagline")
+
+# cursors of the pages shown so far; a new filter starts again at the first page
+history_filters = (tuple(history_regions), history_min, history_max, history_search)
+if st.session_state.get('campaign_filters') != history_filters:
+    st.session_state.campaign_filters = history_filters
+    st.session_state.campaign_cursors = [None]
+cursors = st.session_state.campaign_cursors
+
+page, next_cursor = store.list_campaigns(
+    regions=history_regions, min_budget=history_min or None, max_budget=history_max or None,
+    search=history_search.strip() or None, after=cursors[-1]
+)
+if page.empty:
+    st.info("No campaigns yet." if len(cursors) == 1 else "No more campaigns.")
+else:
+    page['created'] = pd.to_datetime(page['created'], unit='s').dt.strftime('%Y-%m-%d %H:%M')
+    st.dataframe(page.drop(columns=['id']), hide_index=True, use_container_width=True)
+
+    promotions = store.promotions_for(page.loc[page['promotions'] > 0, 'id'])
+    if not promotions.empty:
+        with st.expander(f"Promotions for these campaigns ({len(promotions)})"):
+            for promotion in promotions.itertuples():
+                st.markdown(f"**{promotion.region}** · {promotion.content_type}")
+                st.write(promotion.text)
+
+nav_cols = st.columns([1, 1, 6])
+if nav_cols[0].button("Previous", disabled=len(cursors) == 1):
+    cursors.pop()
+    st.rerun()
+if nav_cols[1].button("Next", disabled=next_cursor is None):
+    cursors.append(next_cursor)
+    st.rerun()
+nav_cols[2].caption(f"Page {len(cursors)}")
\ No newline at end of file